@@ -2,12 +2,10 @@
 from sqladmin.authentication import AuthenticationBackend
 from starlette.requests import Request
 from sqlalchemy import select
-from passlib.context import CryptContext
 from database import AsyncSessionLocal
 from config import settings
 import models as m
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import utils
 
 class AdminAuth(AuthenticationBackend):
     def __init__(self):
@@ -22,9 +20,15 @@ class AdminAuth(AuthenticationBackend):
             result = await session.execute(select(m.User).where(m.User.email == email))
             user = result.scalar_one_or_none()
 
-            if not user or not pwd_context.verify(password, user.password) or user.roleId != 1:
+            if not user or not await utils.verify_password_async(password, user.password):
+                return False
+            if user.roleId != 1:
                 return False
 
+            if utils.needs_rehash(user.password):
+                user.password = await utils.hash_password_async(password)
+                await session.commit()
+
             request.session.update({"admin": True})
             return True
 
@@ -1,5 +1,14 @@
 from sqladmin import ModelView
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import models as m
+import load_profiles
+from cache import response_cache
+import auth
+import comic_stats
+import comic_detail
+import author_stats
+from database import AsyncSessionLocal
 
 class UserAdmin(ModelView, model=m.User):
     column_list = [m.User.id, m.User.email, m.User.nick, m.User.roleId]
@@ -7,27 +16,113 @@ class UserAdmin(ModelView, model=m.User):
     column_editable_list = [m.User.roleId]
     name = "Пользователь"
     name_plural = "Пользователи"
+
+    async def after_model_change(self, data, model, is_created, request):
+        auth.user_cache.invalidate_tags(auth.user_tag(model.id))
+        # Ник и почта автора входят в документы страниц комиксов
+        response_cache.invalidate_tags("comic_details")
+
+    async def after_model_delete(self, model, request):
+        auth.user_cache.invalidate_tags(auth.user_tag(model.id))
+        response_cache.invalidate_tags("comic_details")
     
 class GenreAdmin(ModelView, model=m.Genre):
     column_list = [m.Genre.id, m.Genre.name]
     column_searchable_list = [m.Genre.name]
     name = "Жанр"
     name_plural = "Жанры"
+
+    async def after_model_change(self, data, model, is_created, request):
+        response_cache.invalidate_tags("genres")
+
+    async def after_model_delete(self, model, request):
+        response_cache.invalidate_tags("genres")
     
 class CommentAdmin(ModelView, model=m.Comment):
     column_list = [m.Comment.id, m.Comment.comment, m.Comment.userID, m.Comment.comicID]
     column_searchable_list = [m.Comment.comment]
     name = "Комментарий"
     name_plural = "Комментарии"
+
+    async def on_model_change(self, data, model, is_created, request):
+        # Вызывается до записи формы в модель: здесь ещё прежний комикс
+        request.state.old_comic_id = None if is_created else model.comicID
+
+    async def after_model_change(self, data, model, is_created, request):
+        old_comic_id = request.state.old_comic_id
+        if old_comic_id == model.comicID:
+            return
+        async with AsyncSessionLocal() as session:
+            await comic_stats.change_comment_count(session, model.comicID, 1)
+            if old_comic_id is not None:
+                await comic_stats.change_comment_count(session, old_comic_id, -1)
+            await session.commit()
+        comic_detail.invalidate(model.comicID)
+        if old_comic_id is not None:
+            comic_detail.invalidate(old_comic_id)
+
+    async def after_model_delete(self, model, request):
+        async with AsyncSessionLocal() as session:
+            await comic_stats.change_comment_count(session, model.comicID, -1)
+            await session.commit()
+        comic_detail.invalidate(model.comicID)
     
 class ComicAdmin(ModelView, model=m.Comic):
     column_list = [m.Comic.id, m.Comic.title, m.Comic.website_recommendation]
     column_searchable_list = [m.Comic.title]
     column_editable_list = [m.Comic.website_recommendation]
+    # Агрегаты, варианты постера и содержимое ведёт приложение, а не форма:
+    # пустое поле stats затёрло бы строку comic_stats, а списки выбора
+    # загружали бы все строки этих таблиц
+    form_excluded_columns = [
+        m.Comic.stats,
+        m.Comic.poster_variants,
+        m.Comic.volumes,
+        m.Comic.favorited_by_users,
+        "comments",
+        "ratings",
+    ]
     name = "Комикс"
     name_plural = "Комиксы"
+
+    def list_query(self, request):
+        return select(m.Comic).options(*load_profiles.ADMIN_LIST)
+
+    async def on_model_change(self, data, model, is_created, request):
+        # Прежний автор: при смене автора пересчитываются оба
+        request.state.old_user_id = None if is_created else model.userID
+
+    async def after_model_change(self, data, model, is_created, request):
+        if is_created:
+            # Без строки comic_stats комикс не попадает в каталог (JOIN по stats)
+            async with AsyncSessionLocal() as session:
+                await session.execute(
+                    pg_insert(m.ComicStats).values(comic_id=model.id).on_conflict_do_nothing()
+                )
+                await session.commit()
+        await self._refresh_authors({model.userID, request.state.old_user_id} - {None})
+        response_cache.invalidate_tags("comics")
+        comic_detail.invalidate(model.id)
+
+    async def after_model_delete(self, model, request):
+        await self._refresh_authors([model.userID])
+        response_cache.invalidate_tags("comics")
+        comic_detail.invalidate(model.id)
+
+    async def _refresh_authors(self, user_ids):
+        async with AsyncSessionLocal() as session:
+            await author_stats.refresh_authors(session, user_ids)
+            await session.commit()
     
 class ComicGenreAdmin(ModelView, model=m.ComicGenre):
     column_list = [m.ComicGenre.comic_id, m.ComicGenre.genre_id]
     name = "Жанр Комикса"
-    name_plural = "Жанры Комиксов"
\ No newline at end of file
+    name_plural = "Жанры Комиксов"
+
+    async def after_model_change(self, data, model, is_created, request):
+        response_cache.invalidate_tags("comics")
+        comic_detail.invalidate(model.comic_id)
+
+    async def after_model_delete(self, model, request):
+        response_cache.invalidate_tags("comics")
+        comic_detail.invalidate(model.comic_id)
\ No newline at end of file
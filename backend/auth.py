@@ -1,15 +1,33 @@
 from jose import JWTError, jwt
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Annotated
+from typing import Annotated, Optional
 from config import settings
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database import get_db
+from cache import TTLCache
 import models as m
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/user/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/user/login", auto_error=False)
+
+# Снимки пользователей для проверки токенов без похода в БД.
+# Сбрасываются при изменении пользователя (user_cache.invalidate_tags(user_tag(id))).
+user_cache = TTLCache(maxsize=settings.USER_CACHE_MAX_ENTRIES, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+@dataclass(frozen=True)
+class CurrentUser:
+    id: int
+    email: str
+    nick: str
+    roleId: int
+    token_version: int
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -17,11 +35,22 @@ def create_access_token(data: dict) -> str:
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
+async def load_current_user(db: AsyncSession, user_id: int) -> Optional[CurrentUser]:
+    async def load():
+        result = await db.execute(
+            select(m.User.id, m.User.email, m.User.nick, m.User.roleId, m.User.token_version)
+            .where(m.User.id == user_id)
+        )
+        row = result.one_or_none()
+        return CurrentUser(*row) if row is not None else None
+
+    return await user_cache.get_or_load(user_id, load, tags=(user_tag(user_id),))
+
 async def get_current_user(
     request: Request,
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[AsyncSession, Depends(get_db)]
-) -> m.User:
+) -> CurrentUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -31,18 +60,31 @@ async def get_current_user(
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("sub")
-        nick: str = payload.get("nick")
         id: int = payload.get("id")
-        role: int = payload.get("role")
-        if not email:
+        version: int = payload.get("ver", 0)
+        if not email or not isinstance(id, int):
             raise credentials_exception
     except JWTError as e:
         raise credentials_exception from e
     
-    result = await db.execute(select(m.User).where(m.User.email == email))
-    user = result.scalar_one_or_none()
+    # Подпись уже проверена; из БД (или кэша) нужна только версия токена,
+    # чтобы отозванные токены и удалённые пользователи не проходили
+    user = await load_current_user(db, id)
     
-    if user is None:
+    if user is None or user.email != email or user.token_version != version:
         raise credentials_exception
         
-    return user
\ No newline at end of file
+    return user
+
+async def get_optional_user(
+    request: Request,
+    token: Annotated[Optional[str], Depends(optional_oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(get_db)]
+) -> Optional[CurrentUser]:
+    # Для эндпоинтов, которые работают и без входа: неверный токен — аноним
+    if not token:
+        return None
+    try:
+        return await get_current_user(request, token, db)
+    except HTTPException:
+        return None
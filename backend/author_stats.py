@@ -0,0 +1,109 @@
+import asyncio
+import sys
+from datetime import date
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import AsyncSessionLocal
+import models as m
+
+
+async def comic_added(db, user_id: int, published: date):
+    stmt = pg_insert(m.AuthorStats).values(
+        user_id=user_id,
+        comic_count=1,
+        first_published=published,
+        last_published=published,
+        ratings_received=0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={
+            "comic_count": m.AuthorStats.comic_count + 1,
+            "first_published": func.least(m.AuthorStats.first_published, published),
+            "last_published": func.greatest(m.AuthorStats.last_published, published),
+        },
+    )
+    await db.execute(stmt)
+
+
+def _computed(user_ids=None):
+    # Счётчики, посчитанные заново из comics и comic_stats
+    stmt = (
+        select(
+            m.Comic.userID.label("user_id"),
+            func.count(m.Comic.id).label("comic_count"),
+            func.min(m.Comic.date_of_out).label("first_published"),
+            func.max(m.Comic.date_of_out).label("last_published"),
+            func.coalesce(func.sum(m.ComicStats.rating_count), 0).label("ratings_received"),
+        )
+        .outerjoin(m.ComicStats, m.ComicStats.comic_id == m.Comic.id)
+        .group_by(m.Comic.userID)
+    )
+    if user_ids is not None:
+        stmt = stmt.where(m.Comic.userID.in_(user_ids))
+    return stmt
+
+
+async def rebuild_author_stats(db, user_ids=None):
+    # db — сессия или соединение; user_ids (список или подзапрос) ограничивает
+    # пересчёт этими авторами. Авторы без комиксов удаляются из таблицы.
+    cleanup = delete(m.AuthorStats)
+    if user_ids is not None:
+        cleanup = cleanup.where(m.AuthorStats.user_id.in_(user_ids))
+    await db.execute(cleanup)
+    await db.execute(
+        pg_insert(m.AuthorStats).from_select(
+            ["user_id", "comic_count", "first_published", "last_published", "ratings_received"],
+            _computed(user_ids),
+        )
+    )
+
+
+async def refresh_authors(db, user_ids):
+    # После удаления комикса даты не уменьшить на месте — пересчёт одного
+    # автора идёт по индексу comics.userID
+    await rebuild_author_stats(db, list(user_ids))
+
+
+async def check_author_stats(db) -> list:
+    # user_id авторов, у которых сохранённые счётчики расходятся с данными
+    computed = _computed().subquery()
+    stored = m.AuthorStats
+    differs = (
+        select(func.coalesce(computed.c.user_id, stored.user_id))
+        .select_from(computed)
+        .join(stored, stored.user_id == computed.c.user_id, full=True)
+        .where(
+            case(
+                (stored.user_id.is_(None), True),
+                (computed.c.user_id.is_(None), stored.comic_count != 0),
+                else_=(
+                    stored.comic_count.is_distinct_from(computed.c.comic_count)
+                    | stored.first_published.is_distinct_from(computed.c.first_published)
+                    | stored.last_published.is_distinct_from(computed.c.last_published)
+                    | stored.ratings_received.is_distinct_from(computed.c.ratings_received)
+                ),
+            )
+        )
+    )
+    result = await db.execute(differs)
+    return result.scalars().all()
+
+
+async def main(command: str):
+    async with AsyncSessionLocal() as session:
+        if command == "check":
+            broken = await check_author_stats(session)
+            print(f"Расхождений: {len(broken)}" + (f", авторы {broken[:20]}" if broken else ""))
+            return 1 if broken else 0
+        await rebuild_author_stats(session)
+        await session.commit()
+        print("Статистика авторов пересчитана")
+        return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("check", "rebuild"):
+        print("Использование: python author_stats.py check|rebuild")
+        sys.exit(1)
+    sys.exit(asyncio.run(main(sys.argv[1])))
@@ -0,0 +1,259 @@
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, select, func, text
+from cache import response_cache
+from database import engine, replicas, AsyncSessionLocal
+from main import app
+import auth
+import models as m
+
+# Нагрузочный прогон всех роутеров через ASGI-клиент в том же процессе:
+#   python -m bench.endpoints --requests 500 --out results.json
+#   python -m bench.endpoints --compare results.json
+# Для каждого эндпоинта: p50/p99, пропускная способность, число SQL-запросов
+# и строк на запрос. Данные берутся из текущей базы — на большом наборе
+# (100k комиксов, 10M страниц) результаты осмысленнее, чем на seed.py.
+# Замеряются только чтения (и вход): запись в избранное, комментарии,
+# оценки и создание глав меняли бы измеряемые данные, а создание глав ещё и
+# ставит задачи на диск, поэтому прогоны не были бы воспроизводимы.
+
+SAMPLE_SIZE = 1000
+
+
+class SqlCounter:
+    # Считает выполненные запросы и полученные строки по всем движкам.
+    # Для SELECT rowcount отдаёт asyncpg; драйверы без него дают 0.
+    def __init__(self):
+        self.statements = 0
+        self.rows = 0
+
+    def install(self):
+        for target in [engine, *replicas.engines]:
+            event.listen(target.sync_engine, "after_cursor_execute", self._after_execute)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.rows += max(cursor.rowcount or 0, 0)
+
+    def snapshot(self):
+        return self.statements, self.rows
+
+
+class Dataset:
+    # Случайные существующие id и токены, из которых собираются запросы
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    async def load(self):
+        async with AsyncSessionLocal() as db:
+            async def sample(column, where=None):
+                stmt = select(column)
+                if where is not None:
+                    stmt = stmt.where(where)
+                result = await db.execute(stmt.order_by(func.random()).limit(SAMPLE_SIZE))
+                return result.scalars().all()
+
+            self.comic_ids = await sample(m.Comic.id)
+            self.chapter_ids = await sample(m.Chapter.id)
+            self.genre_ids = await sample(m.Genre.id)
+            self.nicks = await sample(m.User.nick)
+            titles = await sample(m.Comic.title)
+            self.words = [word for title in titles for word in title.split() if len(word) > 3] or ["comic"]
+
+            users = await db.execute(
+                select(m.User.id, m.User.email, m.User.nick, m.User.roleId, m.User.token_version)
+                .order_by(func.random())
+                .limit(SAMPLE_SIZE)
+            )
+            self.users = users.all()
+
+            counts = {}
+            for name in ("comics", "volumes", "chapters", "pages", "ratings", "comments", "users"):
+                counts[name] = await db.scalar(text(f"SELECT count(*) FROM {name}"))
+            self.counts = counts
+        if not self.comic_ids or not self.users:
+            sys.exit("В базе нет комиксов или пользователей — сначала заполните её")
+
+    def pick(self, values):
+        return self.rng.choice(values)
+
+    def headers(self, user=None) -> dict:
+        user = user or self.pick(self.users)
+        token = auth.create_access_token(
+            data={"sub": user[1], "nick": user[2], "id": user[0], "role": user[3], "ver": user[4]}
+        )
+        return {"Authorization": f"Bearer {token}"}
+
+
+def scenarios(data: Dataset, password: str):
+    # (имя, функция -> аргументы client.request)
+    pick = data.pick
+    return [
+        ("GET /comic/", lambda: ("GET", "/api/comic/", {})),
+        ("GET /comic/comics", lambda: ("GET", "/api/comic/comics", {
+            "params": {"sort": pick(["asc", "avg_rating", "popular", "trending"]), "page": data.rng.randint(1, 50)},
+        })),
+        ("GET /comic/comics?cursor", lambda: ("GET", "/api/comic/comics", {
+            "params": {"sort": pick(["asc", "avg_rating", "popular", "trending"]), "cursor": ""},
+        })),
+        ("GET /comic/comics?genres", lambda: ("GET", "/api/comic/comics", {
+            "params": {"genres": pick(data.genre_ids) if data.genre_ids else [], "min_rating": 5},
+        })),
+        ("GET /comic/search", lambda: ("GET", "/api/comic/search", {"params": {"title": pick(data.words)}})),
+        ("GET /comic/recomm", lambda: ("GET", "/api/comic/recomm", {})),
+        ("GET /comic/new_5", lambda: ("GET", "/api/comic/new_5", {})),
+        ("GET /comic/favorites/{nick}", lambda: ("GET", f"/api/comic/favorites/{pick(data.nicks)}", {
+            "params": {"cursor": ""},
+        })),
+        ("GET /comic/comics/{id}", lambda: ("GET", f"/api/comic/comics/{pick(data.comic_ids)}", {})),
+        ("GET /comic/chapters/{id}", lambda: ("GET", f"/api/comic/chapters/{pick(data.chapter_ids)}", {})),
+        ("GET /comic/{id}/is_favorite", lambda: ("GET", f"/api/comic/{pick(data.comic_ids)}/is_favorite", {
+            "headers": data.headers(),
+        })),
+        ("GET /comm/{id}/comments", lambda: ("GET", f"/api/comm/{pick(data.comic_ids)}/comments", {
+            "params": {"cursor": ""},
+        })),
+        ("GET /genre/", lambda: ("GET", "/api/genre/", {})),
+        ("GET /aftor/new_authors", lambda: ("GET", "/api/aftor/new_authors", {})),
+        ("GET /user/users/me", lambda: ("GET", "/api/user/users/me", {"headers": data.headers()})),
+        ("POST /user/login", lambda: ("POST", "/api/user/login", {
+            "data": {"username": pick(data.users)[1], "password": password},
+        })),
+    ]
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_scenario(client, counter, build, requests: int, concurrency: int, cold: bool) -> dict:
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(build())
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            method, url, kwargs = queue.get_nowait()
+            if cold:
+                response_cache.clear()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    statements, rows = counter.snapshot()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    statements, rows = counter.statements - statements, counter.rows - rows
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else None,
+        "sql_per_request": round(statements / requests, 2),
+        "rows_per_request": round(rows / requests, 1),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, row in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before:
+            continue
+        ratio = row["p50_ms"] / before["p50_ms"] if before["p50_ms"] else 1.0
+        flag = ""
+        if ratio > threshold:
+            flag = "  <-- регрессия"
+            regressions.append(name)
+        print(
+            f"{name:36} p50 {before['p50_ms']:>9} -> {row['p50_ms']:>9} ms (x{ratio:.2f})"
+            f"  sql {before['sql_per_request']} -> {row['sql_per_request']}{flag}"
+        )
+    return regressions
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    data = Dataset(rng)
+    await data.load()
+    counter = SqlCounter()
+    counter.install()
+
+    selected = [
+        (name, build) for name, build in scenarios(data, args.password)
+        if not args.only or any(part in name for part in args.only)
+    ]
+    results = {
+        "commit": git_commit(),
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "dataset": data.counts,
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "cold": args.cold},
+        "endpoints": {},
+    }
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, build in selected:
+            # Прогрев: пул соединений и кэши, как у работающего сервера
+            for _ in range(min(args.warmup, args.requests)):
+                method, url, kwargs = build()
+                await client.request(method, url, **kwargs)
+            row = await run_scenario(client, counter, build, args.requests, args.concurrency, args.cold)
+            results["endpoints"][name] = row
+            print(
+                f"{name:36} p50 {row['p50_ms']:>9} ms  p99 {row['p99_ms']:>9} ms  "
+                f"{row['throughput_rps']:>8} rps  sql {row['sql_per_request']:>6}  "
+                f"rows {row['rows_per_request']:>8}  errors {row['errors']}"
+            )
+    await replicas.dispose()
+    await engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200, help="запросов на эндпоинт")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--cold", action="store_true", help="сбрасывать кэш ответов перед каждым запросом")
+    parser.add_argument("--only", nargs="*", help="подстроки имён эндпоинтов")
+    parser.add_argument("--password", default="password", help="пароль пользователей для POST /user/login")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out")
+    parser.add_argument("--compare", help="JSON прошлого прогона")
+    parser.add_argument("--threshold", type=float, default=1.2, help="допустимый рост p50 при --compare")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,98 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from sqlalchemy import text
+from database import engine
+
+# Замер горячих выборок по внешним ключам до и после v0003_hot_indexes:
+#   python migrate.py down 2 && python -m bench.indexes --out before.json
+#   python migrate.py && python -m bench.indexes --compare before.json
+# Имеет смысл на большой базе (см. генератор тестовых данных).
+
+QUERIES = {
+    "pages_of_chapter": (
+        "SELECT id, number, image_url FROM pages WHERE chapter_id = :id ORDER BY number",
+        "SELECT id FROM chapters ORDER BY random() LIMIT :n",
+    ),
+    "chapters_of_volume": (
+        "SELECT id, number FROM chapters WHERE volume_id = :id ORDER BY number",
+        "SELECT id FROM volumes ORDER BY random() LIMIT :n",
+    ),
+    "volumes_of_comic": (
+        "SELECT id, number FROM volumes WHERE comic_id = :id ORDER BY number",
+        "SELECT id FROM comics ORDER BY random() LIMIT :n",
+    ),
+    "ratings_of_comic": (
+        "SELECT count(*) FROM ratings WHERE comic_id = :id",
+        "SELECT id FROM comics ORDER BY random() LIMIT :n",
+    ),
+    "comics_of_genre": (
+        "SELECT comic_id FROM comic_genres WHERE genre_id = :id ORDER BY comic_id LIMIT 20",
+        "SELECT id FROM genres ORDER BY random() LIMIT :n",
+    ),
+    "favorites_of_comic": (
+        "SELECT count(*) FROM user_favorite_comics WHERE comic_id = :id",
+        "SELECT id FROM comics ORDER BY random() LIMIT :n",
+    ),
+    "comics_of_author": (
+        'SELECT id FROM comics WHERE "userID" = :id',
+        'SELECT DISTINCT "userID" FROM comics ORDER BY 1 LIMIT :n',
+    ),
+    "newest_comics": (
+        "SELECT id FROM comics ORDER BY date_of_out DESC, id DESC LIMIT 5",
+        "SELECT 0 FROM generate_series(1, :n)",
+    ),
+}
+
+
+async def run(samples: int) -> dict:
+    report = {}
+    async with engine.connect() as conn:
+        for name, (query, sample_query) in QUERIES.items():
+            ids = (await conn.execute(text(sample_query), {"n": samples})).scalars().all()
+            timings = []
+            for sample_id in ids:
+                started = time.perf_counter()
+                await conn.execute(text(query), {"id": sample_id})
+                timings.append((time.perf_counter() - started) * 1000)
+            plan = (await conn.execute(
+                text(f"EXPLAIN {query}"), {"id": ids[0] if ids else 0}
+            )).scalars().first()
+            report[name] = {
+                "samples": len(timings),
+                "p50_ms": round(statistics.median(timings), 3) if timings else None,
+                "max_ms": round(max(timings), 3) if timings else None,
+                "plan": plan.strip() if plan else None,
+            }
+    await engine.dispose()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--out")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.samples))
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    for name, row in report.items():
+        line = f"{name:22} p50 {row['p50_ms']} ms  max {row['max_ms']} ms"
+        before = baseline.get(name, {}).get("p50_ms")
+        if before and row["p50_ms"]:
+            line += f"  (было {before} ms, x{before / row['p50_ms']:.1f})"
+        print(line)
+        print(f"{'':22} {row['plan']}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
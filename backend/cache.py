@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterable, Optional
+from config import settings
+
+_MISSING = object()
+
+
+class _LoaderCancelled(Exception):
+    # Загрузку отменили вместе с запросом, который её начал; ожидающие
+    # того же ключа повторяют попытку сами
+    pass
+
+
+class TTLCache:
+    # LRU с ограничением по размеру и TTL. Записи помечаются тегами,
+    # invalidate_tags() сбрасывает все записи тега. Конкурентные промахи
+    # по одному ключу ждут одну загрузку (single-flight).
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict = OrderedDict()
+        self._tags: dict[str, set] = {}
+        self._tag_versions: dict[str, int] = {}
+        self._inflight: dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value, tags = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tags: Iterable[str] = ()):
+        tags = tuple(tags)
+        if key in self._data:
+            self._remove(key)
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+
+    def invalidate_tags(self, *tags: str):
+        for tag in tags:
+            self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+            for key in self._tags.pop(tag, set()):
+                self._remove(key)
+
+    def clear(self):
+        for tag in list(self._tags):
+            self.invalidate_tags(tag)
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "inflight": len(self._inflight),
+        }
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        while True:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                return value
+            self.misses += 1
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                break
+            try:
+                return await asyncio.shield(inflight)
+            except _LoaderCancelled:
+                continue
+
+        tags = tuple(tags)
+        versions = self._versions(tags)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.set_exception(_LoaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Исключение уже получено вызывающим, ожидающих может не быть
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        # Если за время загрузки тег инвалидировали, результат мог устареть
+        if versions == self._versions(tags):
+            self.set(key, value, ttl=ttl, tags=tags)
+        future.set_result(value)
+        return value
+
+    def _versions(self, tags: tuple) -> tuple:
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def _remove(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+response_cache = TTLCache(maxsize=settings.CACHE_MAX_ENTRIES, ttl=settings.CACHE_TTL_SECONDS)
@@ -0,0 +1,95 @@
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from cache import response_cache
+from database import from_primary
+from config import settings
+
+# Документ страницы комикса (pyd.ComicResponse) собирается одним запросом
+# в JSON на стороне Postgres и кэшируется готовыми байтами.
+# Сбрасывается тегом comic_tag(id) при изменении томов, глав, жанров,
+# оценок и комментариев комикса; "comic_details" сбрасывает все документы.
+# Документ для кэша всегда читается из основной базы: отстающая реплика
+# сразу после invalidate() заполнила бы кэш старой версией на весь TTL.
+
+DETAIL_SQL = text("""
+SELECT CAST(json_build_object(
+    'id', c.id,
+    'title', c.title,
+    'desc', c."desc",
+    'date_of_out', c.date_of_out,
+    'website_recommendation', c.website_recommendation,
+    'img', c.img,
+    'poster_variants', COALESCE((
+        SELECT json_agg(json_build_object(
+            'width', v.width, 'height', v.height, 'format', v.format, 'url', v.url
+        ) ORDER BY v.width)
+        FROM image_variants v
+        WHERE v.comic_id = c.id
+    ), '[]'),
+    'average_rating', round(CAST(s.avg_rating AS numeric), 2),
+    'rating_count', COALESCE(s.rating_count, 0),
+    'comment_count', COALESCE(s.comment_count, 0),
+    'userID', c."userID",
+    'rating_histogram', (
+        SELECT json_agg(COALESCE(h.votes, 0) ORDER BY b.value)
+        FROM generate_series(0, 10) AS b(value)
+        LEFT JOIN comic_rating_histogram h ON h.comic_id = c.id AND h.value = b.value
+    ),
+    'user', json_build_object('id', u.id, 'email', u.email, 'nick', u.nick),
+    'genres', COALESCE((
+        SELECT json_agg(json_build_object('name', g.name, 'id', g.id) ORDER BY g.name)
+        FROM comic_genres cg
+        JOIN genres g ON g.id = cg.genre_id
+        WHERE cg.comic_id = c.id
+    ), '[]'),
+    'volumes', COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', vl.id,
+            'number', vl.number,
+            'chapters', COALESCE((
+                SELECT json_agg(json_build_object(
+                    'id', ch.id, 'number', ch.number, 'title', ch.title, 'pages', json_build_array()
+                ) ORDER BY ch.number)
+                FROM chapters ch
+                WHERE ch.volume_id = vl.id
+            ), '[]')
+        ) ORDER BY vl.number)
+        FROM volumes vl
+        WHERE vl.comic_id = c.id
+    ), '[]')
+) AS text) AS document
+FROM comics c
+JOIN users u ON u.id = c."userID"
+LEFT JOIN comic_stats s ON s.comic_id = c.id
+WHERE c.id = :comic_id
+""")
+
+
+def comic_tag(comic_id: int) -> str:
+    return f"comic:{comic_id}"
+
+
+def invalidate(*comic_ids: int):
+    response_cache.invalidate_tags(*(comic_tag(comic_id) for comic_id in comic_ids))
+
+
+async def build_document(db: AsyncSession, comic_id: int):
+    document = await db.scalar(DETAIL_SQL, {"comic_id": comic_id})
+    return document.encode() if document is not None else None
+
+
+async def get_document(comic_id: int) -> bytes:
+    async def load(db):
+        document = await build_document(db, comic_id)
+        if document is None:
+            # Исключение не кэшируется: комикс с этим id может появиться позже
+            raise HTTPException(status_code=404, detail="Комикс не найден")
+        return document
+
+    return await response_cache.get_or_load(
+        ("comic_detail", comic_id),
+        from_primary(load),
+        ttl=settings.COMIC_DETAIL_TTL_SECONDS,
+        tags=(comic_tag(comic_id), "genres", "comic_details"),
+    )
@@ -0,0 +1,272 @@
+import asyncio
+import csv
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete, func, cast, Float, Integer, exists, text, distinct
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import AsyncSessionLocal
+import models as m
+import author_stats
+
+
+# Одна команда: блокирует старую оценку пользователя, обновляет или вставляет
+# новую, поправляет гистограмму, comic_stats и author_stats (только для новой
+# оценки) и возвращает свежий агрегат.
+# Если параллельный запрос успел вставить оценку первым, applied = 0.
+UPSERT_RATING_SQL = text("""
+WITH old AS (
+    SELECT id, value FROM ratings
+    WHERE user_id = CAST(:user_id AS integer) AND comic_id = CAST(:comic_id AS integer)
+    FOR UPDATE
+),
+updated AS (
+    UPDATE ratings SET value = CAST(:value AS integer)
+    FROM old
+    WHERE ratings.id = old.id
+    RETURNING old.value AS old_value
+),
+inserted AS (
+    INSERT INTO ratings (user_id, comic_id, value)
+    SELECT CAST(:user_id AS integer), CAST(:comic_id AS integer), CAST(:value AS integer)
+    WHERE NOT EXISTS (SELECT 1 FROM old)
+    ON CONFLICT (user_id, comic_id) DO NOTHING
+    RETURNING value
+),
+delta AS (
+    SELECT CAST(:value AS integer) - old_value AS sum_delta, 0 AS count_delta, old_value FROM updated
+    UNION ALL
+    SELECT value, 1, CAST(NULL AS integer) FROM inserted
+),
+bucket_out AS (
+    UPDATE comic_rating_histogram h SET votes = h.votes - 1
+    FROM delta
+    WHERE h.comic_id = CAST(:comic_id AS integer)
+      AND h.value = delta.old_value
+      AND delta.old_value <> CAST(:value AS integer)
+),
+bucket_in AS (
+    INSERT INTO comic_rating_histogram (comic_id, value, votes)
+    SELECT CAST(:comic_id AS integer), CAST(:value AS integer), 1 FROM delta
+    WHERE delta.old_value IS DISTINCT FROM CAST(:value AS integer)
+    ON CONFLICT (comic_id, value) DO UPDATE SET votes = comic_rating_histogram.votes + 1
+),
+stats AS (
+    UPDATE comic_stats s SET
+        rating_sum = s.rating_sum + delta.sum_delta,
+        rating_count = s.rating_count + delta.count_delta,
+        avg_rating = CAST(s.rating_sum + delta.sum_delta AS double precision)
+            / NULLIF(s.rating_count + delta.count_delta, 0)
+    FROM delta
+    WHERE s.comic_id = CAST(:comic_id AS integer)
+    RETURNING s.avg_rating, s.rating_count
+),
+author AS (
+    UPDATE author_stats a SET ratings_received = a.ratings_received + delta.count_delta
+    FROM delta, comics c
+    WHERE c.id = CAST(:comic_id AS integer)
+      AND a.user_id = c."userID"
+      AND delta.count_delta <> 0
+)
+SELECT applied.n AS applied, stats.avg_rating, stats.rating_count
+FROM (SELECT count(*) AS n FROM delta) AS applied
+LEFT JOIN stats ON true
+""")
+
+
+async def upsert_rating(db: AsyncSession, user_id: int, comic_id: int, value: int):
+    params = {"user_id": user_id, "comic_id": comic_id, "value": value}
+    for _ in range(2):
+        row = (await db.execute(UPSERT_RATING_SQL, params)).one()
+        if row.applied:
+            return row.avg_rating, row.rating_count
+    raise HTTPException(status_code=409, detail="Оценка изменяется параллельным запросом")
+
+
+async def get_rating_histogram(db: AsyncSession, comic_id: int) -> list[int]:
+    result = await db.execute(
+        select(m.ComicRatingBucket.value, m.ComicRatingBucket.votes)
+        .where(m.ComicRatingBucket.comic_id == comic_id)
+    )
+    histogram = [0] * 11
+    for value, votes in result.all():
+        histogram[value] = votes
+    return histogram
+
+
+async def change_comment_count(db: AsyncSession, comic_id: int, delta: int):
+    await db.execute(
+        update(m.ComicStats)
+        .where(m.ComicStats.comic_id == comic_id)
+        .values(comment_count=m.ComicStats.comment_count + delta)
+    )
+
+
+async def rebuild_comic_stats(db: AsyncSession, only_missing: bool = False, comic_ids=None):
+    # db — сессия или соединение. Пересчёт агрегатов из ratings и comments.
+    # only_missing=True дозаполняет только комиксы без строки в comic_stats
+    # (миграция v0010), comic_ids (список или подзапрос) ограничивает
+    # пересчёт этими комиксами.
+    totals = (
+        select(
+            m.Rating.comic_id,
+            func.sum(m.Rating.value).label("rating_sum"),
+            func.count(m.Rating.id).label("rating_count"),
+            cast(func.avg(m.Rating.value), Float).label("avg_rating"),
+        )
+        .group_by(m.Rating.comic_id)
+        .subquery()
+    )
+    comments = (
+        select(m.Comment.comicID, func.count(m.Comment.id).label("comment_count"))
+        .group_by(m.Comment.comicID)
+        .subquery()
+    )
+    source = (
+        select(
+            m.Comic.id,
+            func.coalesce(totals.c.rating_sum, 0),
+            func.coalesce(totals.c.rating_count, 0),
+            totals.c.avg_rating,
+            func.coalesce(comments.c.comment_count, 0),
+        )
+        .outerjoin(totals, totals.c.comic_id == m.Comic.id)
+        .outerjoin(comments, comments.c.comicID == m.Comic.id)
+    )
+    missing = ~exists().where(m.ComicStats.comic_id == m.Comic.id)
+    if only_missing:
+        source = source.where(missing)
+
+    buckets = (
+        select(m.Rating.comic_id, m.Rating.value, func.count(m.Rating.id))
+        .group_by(m.Rating.comic_id, m.Rating.value)
+    )
+    if comic_ids is not None:
+        source = source.where(m.Comic.id.in_(comic_ids))
+        buckets = buckets.where(m.Rating.comic_id.in_(comic_ids))
+    if only_missing:
+        buckets = buckets.where(
+            ~exists().where(m.ComicStats.comic_id == m.Rating.comic_id)
+        )
+    elif comic_ids is not None:
+        await db.execute(delete(m.ComicRatingBucket).where(m.ComicRatingBucket.comic_id.in_(comic_ids)))
+    else:
+        await db.execute(delete(m.ComicRatingBucket))
+
+    await db.execute(
+        pg_insert(m.ComicRatingBucket)
+        .from_select(["comic_id", "value", "votes"], buckets)
+        .on_conflict_do_nothing()
+    )
+
+    stmt = pg_insert(m.ComicStats).from_select(
+        ["comic_id", "rating_sum", "rating_count", "avg_rating", "comment_count"], source
+    )
+    if only_missing:
+        stmt = stmt.on_conflict_do_nothing()
+    else:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["comic_id"],
+            set_={
+                "rating_sum": stmt.excluded.rating_sum,
+                "rating_count": stmt.excluded.rating_count,
+                "avg_rating": stmt.excluded.avg_rating,
+                "comment_count": stmt.excluded.comment_count,
+            },
+        )
+    await db.execute(stmt)
+
+
+async def import_ratings(db: AsyncSession, batches) -> dict:
+    # Массовая загрузка оценок из старой системы: COPY во временную таблицу,
+    # затем один INSERT ... ON CONFLICT и пересчёт агрегатов затронутых комиксов.
+    # batches — (async) итератор списков кортежей (user_id, comic_id, value,
+    # created_at); при повторе пары user_id/comic_id побеждает последняя строка.
+    # created_at — время оценки в старой системе или None: оценка без времени
+    # не попадает в trending, иначе весь импорт выглядел бы свежими событиями.
+    # У уже существующей оценки created_at не меняется.
+    conn = await db.connection()
+    raw = await conn.get_raw_connection()
+    driver = raw.driver_connection
+
+    await db.execute(text("""
+        CREATE TEMP TABLE ratings_import (
+            ord bigserial,
+            user_id integer,
+            comic_id integer,
+            value integer,
+            created_at timestamptz
+        ) ON COMMIT DROP
+    """))
+    received = 0
+    async for batch in _as_async(batches):
+        if not batch:
+            continue
+        await driver.copy_records_to_table(
+            "ratings_import",
+            records=batch,
+            columns=["user_id", "comic_id", "value", "created_at"],
+        )
+        received += len(batch)
+
+    result = await db.execute(text("""
+        INSERT INTO ratings (user_id, comic_id, value, created_at)
+        SELECT DISTINCT ON (i.user_id, i.comic_id) i.user_id, i.comic_id, i.value, i.created_at
+        FROM ratings_import i
+        JOIN users u ON u.id = i.user_id
+        JOIN comics c ON c.id = i.comic_id
+        WHERE i.value BETWEEN 0 AND 10
+        ORDER BY i.user_id, i.comic_id, i.ord DESC
+        ON CONFLICT (user_id, comic_id) DO UPDATE SET value = EXCLUDED.value
+    """))
+    imported = result.rowcount
+
+    affected = text("SELECT DISTINCT comic_id FROM ratings_import").columns(comic_id=Integer)
+    affected_ids = select(affected.subquery().c.comic_id)
+    await rebuild_comic_stats(db, comic_ids=affected_ids)
+    await author_stats.rebuild_author_stats(
+        db, user_ids=select(distinct(m.Comic.userID)).where(m.Comic.id.in_(affected_ids))
+    )
+    return {"received": received, "imported": imported, "skipped": received - imported}
+
+
+def _parse_time(value: str):
+    # ISO 8601; время без пояса считается UTC
+    if not value.strip():
+        return None
+    parsed = datetime.fromisoformat(value.strip())
+    return parsed if parsed.tzinfo is not None else parsed.replace(tzinfo=timezone.utc)
+
+
+def csv_rating_batches(text_file, batch_size: int = 10000):
+    # CSV с колонками user_id,comic_id,value[,created_at]; строка заголовка необязательна
+    batch = []
+    for row in csv.reader(text_file):
+        if not row or not row[0].strip().lstrip("-").isdigit():
+            continue
+        created_at = _parse_time(row[3]) if len(row) > 3 else None
+        batch.append((int(row[0]), int(row[1]), int(row[2]), created_at))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def _as_async(batches):
+    if hasattr(batches, "__aiter__"):
+        async for batch in batches:
+            yield batch
+    else:
+        for batch in batches:
+            yield batch
+
+
+async def rebuild():
+    async with AsyncSessionLocal() as session:
+        await rebuild_comic_stats(session)
+        await session.commit()
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
@@ -7,11 +7,89 @@ class Settings(BaseSettings):
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "password"
     DB_NAME: str = "default"
+    # Полный URL перекрывает DB_* (например, отдельная база PostgreSQL для тестов)
+    DATABASE_URL: str | None = None
+    # Реплики только для чтения; пусто — все запросы идут в основную базу
+    DB_REPLICA_URLS: list[str] = []
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_TIMEOUT: float = 30.0
+    # Сколько не обращаться к реплике после ошибки соединения
+    DB_REPLICA_RETRY_SECONDS: float = 10.0
+    # Сколько после записи читать из основной базы (запас на отставание реплик)
+    DB_STICKY_SECONDS: float = 5.0
     
     SECRET_KEY: str  
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Cost factor bcrypt; старые хэши пересчитываются при входе
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE: int = 64
+
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    USER_CACHE_TTL_SECONDS: float = 60.0
+
+    CACHE_MAX_ENTRIES: int = 1024
+    CACHE_TTL_SECONDS: float = 30.0
+    # Сколько первых страниц каталога кэшировать
+    CACHE_CATALOG_PAGES: int = 3
+    # Документы страниц комиксов сбрасываются явно, TTL — страховка
+    COMIC_DETAIL_TTL_SECONDS: float = 300.0
+
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_FILE_BYTES: int = 20 * 1024 * 1024
+    UPLOAD_MAX_REQUEST_BYTES: int = 1024 * 1024 * 1024
+    UPLOAD_MAX_CONCURRENT_WRITES: int = 8
+    # Импорт архива (importer.py): страниц и распакованных байт за раз
+    IMPORT_MAX_PAGES: int = 50000
+    IMPORT_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+
+    IMAGE_PAGE_WIDTHS: list[int] = [480, 960, 1440]
+    IMAGE_POSTER_WIDTHS: list[int] = [160, 320, 640]
+    # Форматы, которые не поддерживает установленный Pillow, пропускаются
+    IMAGE_VARIANT_FORMATS: list[str] = ["avif", "webp"]
+    IMAGE_QUALITY: int = 80
+    IMAGE_WORKERS: int = 2
+
+    # Очередь файловых задач (jobs.py): число воркеров в процессе, опрос
+    # очереди, сколько задача считается занятой, попытки и пауза перед
+    # повтором (удваивается с каждой попыткой)
+    JOBS_WORKERS: int = 2
+    JOBS_POLL_SECONDS: float = 2.0
+    JOBS_LEASE_SECONDS: float = 300.0
+    JOBS_MAX_ATTEMPTS: int = 5
+    JOBS_RETRY_SECONDS: float = 10.0
+    # Файлы моложе этого возраста сверка не трогает: их загрузка может ещё идти
+    JOBS_ORPHAN_MIN_AGE_SECONDS: float = 3600.0
+
+    # Похожие комиксы (recommend.py): сколько хранить на комикс, минимальная
+    # близость и сколько комиксов считать за один блок матрицы
+    RECOMMEND_TOP_K: int = 50
+    RECOMMEND_MIN_SCORE: float = 0.01
+    RECOMMEND_BLOCK_SIZE: int = 256
+    # Сколько последних понравившихся комиксов берётся для личной подборки
+    RECOMMEND_USER_SEEDS: int = 20
+
+    # Сортировка trending: период полураспада веса события и веса событий
+    TRENDING_HALF_LIFE_HOURS: float = 24.0
+    TRENDING_WEIGHT_RATING: float = 1.0
+    TRENDING_WEIGHT_FAVORITE: float = 2.0
+    TRENDING_WEIGHT_COMMENT: float = 0.5
+    # Как часто фоновая задача добавляет новые события; 0 — не запускать
+    TRENDING_INTERVAL_SECONDS: float = 60.0
+    # Запас на транзакции, которые ещё не закоммичены к моменту обработки
+    TRENDING_LAG_SECONDS: float = 10.0
+
+    # Сколько первых страниц следующей главы отдаёт читалка для предзагрузки
+    READER_PREFETCH_PAGES: int = 3
+
+    # Запросы дольше порога пишутся в журнал вместе с их SQL
+    SLOW_REQUEST_SECONDS: float = 1.0
+    SLOW_REQUEST_MAX_STATEMENTS: int = 50
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -1,18 +1,34 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import declarative_base
+import itertools
+import time
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, AsyncEngine
+from sqlalchemy.orm import declarative_base, Session
 from sqlalchemy.ext.asyncio import async_sessionmaker
+from cache import TTLCache
 from config import settings
 
-DATABASE_URL = (
+DATABASE_URL = settings.DATABASE_URL or (
     f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
 
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,  
-    echo=False  
-)
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        pool_pre_ping=True,
+        echo=False,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+
+
+engine = _create_engine(DATABASE_URL)
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
@@ -24,6 +40,90 @@ AsyncSessionLocal = async_sessionmaker(
 
 Base = declarative_base()
 
-async def get_db():
+
+class ReplicaSet:
+    # Реплики для чтения: выдаются по кругу, недоступная реплика
+    # пропускается DB_REPLICA_RETRY_SECONDS, затем проверяется снова
+    def __init__(self, engines: list[AsyncEngine]):
+        self.engines = engines
+        self._turn = itertools.count()
+        self._down_until: dict[int, float] = {}
+
+    def candidates(self) -> list[AsyncEngine]:
+        if not self.engines:
+            return []
+        start = next(self._turn) % len(self.engines)
+        ordered = self.engines[start:] + self.engines[:start]
+        now = time.monotonic()
+        return [e for e in ordered if self._down_until.get(id(e), 0) <= now]
+
+    def mark_down(self, replica: AsyncEngine):
+        self._down_until[id(replica)] = time.monotonic() + settings.DB_REPLICA_RETRY_SECONDS
+
+    def mark_up(self, replica: AsyncEngine):
+        self._down_until.pop(id(replica), None)
+
+    async def dispose(self):
+        for replica in self.engines:
+            await replica.dispose()
+
+
+replicas = ReplicaSet([_create_engine(url) for url in settings.DB_REPLICA_URLS])
+
+# Клиенты, недавно писавшие в основную базу: их чтения тоже идут в неё,
+# пока реплики не догнали запись (read-your-writes)
+_recent_writers = TTLCache(maxsize=10000, ttl=settings.DB_STICKY_SECONDS)
+
+
+def _client_key(request: Request) -> Optional[str]:
+    # Клиент узнаётся по токену. Анонимные запросы не привязываются: по IP
+    # за одним NAT все посетители читали бы из основной базы после любой
+    # чужой записи, а свои записи без входа аноним не перечитывает
+    return request.headers.get("authorization") or None
+
+
+@event.listens_for(Session, "after_commit")
+def _remember_writer(session: Session):
+    key = session.info.get("client_key")
+    if key is not None:
+        _recent_writers.set(key, True)
+
+
+async def _open_read_session(key: Optional[str]) -> AsyncSession:
+    if key is None or _recent_writers.get(key) is None:
+        for replica in replicas.candidates():
+            session = AsyncSessionLocal(bind=replica)
+            try:
+                # pool_pre_ping проверяет соединение при выдаче из пула
+                await session.connection()
+            except (DBAPIError, OSError):
+                await session.close()
+                replicas.mark_down(replica)
+                continue
+            replicas.mark_up(replica)
+            return session
+    return AsyncSessionLocal()
+
+
+def from_primary(build):
+    # Загрузчик для общего response_cache: build(db) читает основную базу.
+    # Реплика может отставать от только что сброшенной записи, и устаревший
+    # результат получили бы все клиенты на весь TTL
+    async def load():
+        async with AsyncSessionLocal() as db:
+            return await build(db)
+    return load
+
+
+async def get_db(request: Request):
     async with AsyncSessionLocal() as db:
+        db.info["client_key"] = _client_key(request)
+        yield db
+
+
+async def get_read_db(request: Request):
+    # Для GET-эндпоинтов: реплика, если она есть и клиент не писал
+    # в последние DB_STICKY_SECONDS, иначе основная база
+    db = await _open_read_session(_client_key(request))
+    async with db:
         yield db
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import bisect
+import itertools
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import text, insert
+from database import engine, AsyncSessionLocal
+import models as m
+import comic_stats
+import migrate
+import author_stats
+import trending
+import utils
+
+# Генератор больших тестовых наборов для нагрузочных прогонов (bench/):
+#   python generate.py --comics 100000 --ratings 5000000 --comments 1000000
+# Пересоздаёт схему, как seed.py. Строки пишутся через COPY (asyncpg) пачками,
+# на других драйверах — через executemany. Популярность комиксов и жанров
+# распределена по Ципфу, число оценок и избранного у пользователя — с длинным
+# хвостом, длина глав — логнормальная. Картинки страниц — жёсткие ссылки на
+# files/seed/test (или символические, если жёсткие невозможны).
+
+FILES_ROOT = "files"
+COMICS_ROOT = os.path.join(FILES_ROOT, "comics")
+SEED_PAGES_FOLDER = os.path.join(FILES_ROOT, "seed", "test")
+SEED_POSTER_PATH = os.path.join(FILES_ROOT, "seed", "posters", "1.jpg")
+
+ROLES = [(1, "Admin"), (2, "User"), (3, "Aftor")]
+GENRES = [
+    "Fantasy", "Adventure", "Sci-Fi", "Drama", "Comedy", "Horror", "Romance", "Mystery",
+    "Action", "Slice of Life", "Thriller", "Historical", "Sports", "Supernatural", "Mecha",
+    "Psychological", "Cyberpunk", "Detective", "Western", "Post-apocalyptic",
+]
+WORDS = [
+    "shadow", "dragon", "city", "night", "star", "blade", "ocean", "garden", "ghost", "iron",
+    "crown", "river", "winter", "echo", "signal", "forest", "machine", "lantern", "storm", "hunter",
+    "тень", "город", "звезда", "клинок", "океан", "призрак", "корона", "река", "зима", "охотник",
+]
+# Оценки смещены к высоким, как на живых сайтах
+RATING_WEIGHTS = [1, 1, 1, 2, 3, 5, 8, 12, 16, 14, 10]
+FIRST_DATE = date(2005, 1, 1)
+DATE_SPAN_DAYS = 20 * 365
+
+
+def link_file(src: str, dest: str):
+    # Жёсткая ссылка вместо копии; между файловыми системами — символическая
+    try:
+        os.link(src, dest)
+    except FileExistsError:
+        pass
+    except OSError:
+        try:
+            os.symlink(os.path.abspath(src), dest)
+        except FileExistsError:
+            pass
+
+
+class Zipf:
+    # Выбор индекса 0..n-1 с вероятностью ~ 1 / (rank + 1) ** s
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / (rank + 1) ** s for rank in range(n)))
+        self.total = self.cum_weights[-1]
+
+    def sample(self) -> int:
+        return bisect.bisect_left(self.cum_weights, self.rng.random() * self.total)
+
+    def distinct(self, k: int) -> set:
+        n = len(self.cum_weights)
+        k = min(k, n)
+        chosen = set()
+        attempts = 0
+        while len(chosen) < k and attempts < 4 * k:
+            chosen.add(self.sample())
+            attempts += 1
+        # Хвост Ципфа почти не выпадает — добираем равномерно
+        while len(chosen) < k:
+            chosen.add(self.rng.randrange(n))
+        return chosen
+
+
+def long_tail(rng: random.Random, mean: float, cap: int, alpha: float = 1.5) -> int:
+    # Парето с заданным средним: у большинства мало, у немногих очень много
+    scale = mean * (alpha - 1) / alpha
+    return min(cap, int(rng.paretovariate(alpha) * scale))
+
+
+class Loader:
+    # Копит строки по таблицам и сбрасывает их пачками в порядке FK
+    def __init__(self, session, batch_size: int):
+        self.session = session
+        self.batch_size = batch_size
+        self.buffers: dict = {}
+        self.columns: dict = {}
+        self.totals: dict = {}
+        self.order: list = []
+        self.driver = None
+
+    async def start(self):
+        conn = await self.session.connection()
+        if conn.dialect.name == "postgresql":
+            raw = await conn.get_raw_connection()
+            self.driver = raw.driver_connection
+            # Набор можно пересоздать, терять последние коммиты при сбое не страшно
+            await self.session.execute(text("SET synchronous_commit = off"))
+
+    def register(self, table: str, columns: list):
+        self.buffers[table] = []
+        self.columns[table] = columns
+        self.totals[table] = 0
+        self.order.append(table)
+
+    async def add(self, table: str, row: tuple):
+        buffer = self.buffers[table]
+        buffer.append(row)
+        if len(buffer) >= self.batch_size:
+            # Родительские строки должны попасть в базу раньше дочерних
+            for name in self.order[: self.order.index(table) + 1]:
+                await self.flush(name)
+
+    async def flush(self, table: str):
+        rows = self.buffers[table]
+        if not rows:
+            return
+        self.buffers[table] = []
+        columns = self.columns[table]
+        if self.driver is not None:
+            await self.driver.copy_records_to_table(table, records=rows, columns=columns)
+        else:
+            sa_table = m.Base.metadata.tables[table]
+            await self.session.execute(insert(sa_table), [dict(zip(columns, row)) for row in rows])
+        self.totals[table] += len(rows)
+
+    async def flush_all(self):
+        for table in self.order:
+            await self.flush(table)
+
+
+async def reset_schema():
+    async with engine.begin() as conn:
+        await conn.run_sync(m.Base.metadata.drop_all)
+    await migrate.upgrade()
+
+
+async def fix_sequences(session):
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    for table in ("roles", "users", "genres", "comics", "volumes", "chapters", "pages", "comments", "ratings"):
+        await session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+            f"coalesce((SELECT max(id) FROM {table}), 0) + 1, false)"
+        ))
+
+
+def progress(label: str, count: int, started: float):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else 0
+    print(f"{label}: {count} строк за {elapsed:.1f} с ({rate:.0f} строк/с)")
+
+
+async def generate(args):
+    rng = random.Random(args.seed)
+    seed_pages = sorted(
+        name for name in os.listdir(SEED_PAGES_FOLDER)
+        if os.path.splitext(name)[0].isdigit()
+    ) if args.files and os.path.isdir(SEED_PAGES_FOLDER) else []
+
+    await reset_schema()
+    # Один хэш на всех: bcrypt на миллион пользователей занял бы часы
+    password_hash = utils.hash_password(args.password)
+
+    async with AsyncSessionLocal() as session:
+        loader = Loader(session, args.batch_size)
+        await loader.start()
+        loader.register("roles", ["id", "name"])
+        loader.register("users", ["id", "email", "nick", "password", "roleId", "token_version"])
+        loader.register("genres", ["id", "name"])
+        loader.register("comics", ["id", "title", "desc", "date_of_out", "userID", "website_recommendation", "img"])
+        loader.register("comic_genres", ["comic_id", "genre_id"])
+        loader.register("volumes", ["id", "number", "comic_id"])
+        loader.register("chapters", ["id", "number", "title", "volume_id"])
+        loader.register("pages", ["id", "number", "image_url", "chapter_id"])
+        loader.register("ratings", ["id", "user_id", "comic_id", "value", "created_at"])
+        loader.register("user_favorite_comics", ["user_id", "comic_id", "created_at"])
+        loader.register("comments", ["id", "userID", "comicID", "comment", "created_at"])
+
+        started = time.perf_counter()
+        for role in ROLES:
+            await loader.add("roles", role)
+        authors = max(1, min(args.authors, args.users - 1))
+        for user_id in range(1, args.users + 1):
+            role_id = 1 if user_id == 1 else 3 if user_id <= authors + 1 else 2
+            await loader.add("users", (
+                user_id, f"user{user_id}@example.com", f"user{user_id}", password_hash, role_id, 0,
+            ))
+        genre_count = min(args.genres, len(GENRES))
+        for genre_id in range(1, genre_count + 1):
+            await loader.add("genres", (genre_id, GENRES[genre_id - 1]))
+        await loader.flush_all()
+        progress("Пользователи", loader.totals["users"], started)
+
+        started = time.perf_counter()
+        author_zipf = Zipf(authors, args.zipf, rng)
+        genre_zipf = Zipf(genre_count, args.zipf, rng)
+        volume_id = chapter_id = page_id = 0
+        pending_links = []
+        link_tasks = []
+        for comic_id in range(1, args.comics + 1):
+            title = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {comic_id}"
+            folder = title.replace(" ", "_")
+            img = ""
+            if args.files and os.path.exists(SEED_POSTER_PATH):
+                poster_dir = os.path.join(COMICS_ROOT, folder, "poster")
+                poster_path = os.path.join(poster_dir, f"{folder}_poster.jpg")
+                pending_links.append((poster_dir, SEED_POSTER_PATH, poster_path))
+                img = os.path.relpath(poster_path, FILES_ROOT).replace("\\", "/")
+            await loader.add("comics", (
+                comic_id,
+                title,
+                " ".join(rng.choices(WORDS, k=8)),
+                FIRST_DATE + timedelta(days=rng.randrange(DATE_SPAN_DAYS)),
+                author_zipf.sample() + 2,
+                rng.random() < 0.01,
+                img,
+            ))
+            for genre_index in genre_zipf.distinct(rng.randint(1, 3)):
+                await loader.add("comic_genres", (comic_id, genre_index + 1))
+
+            volumes = 1 + int(rng.expovariate(1 / max(args.volumes_mean - 1, 0.01)))
+            for volume_number in range(1, volumes + 1):
+                volume_id += 1
+                await loader.add("volumes", (volume_id, volume_number, comic_id))
+                chapters = max(1, round(rng.lognormvariate(0, 0.8) * args.chapters_mean / 1.377))
+                for chapter_number in range(1, chapters + 1):
+                    chapter_id += 1
+                    await loader.add("chapters", (chapter_id, chapter_number, None, volume_id))
+                    pages = max(1, round(rng.gauss(args.pages_mean, args.pages_mean / 4)))
+                    chapter_dir = os.path.join(COMICS_ROOT, folder, "comic", f"vl{volume_number}", f"ch{chapter_number}")
+                    for page_number in range(1, pages + 1):
+                        page_id += 1
+                        dest = os.path.join(chapter_dir, f"{page_number}.jpg")
+                        if seed_pages:
+                            source = os.path.join(SEED_PAGES_FOLDER, seed_pages[(page_number - 1) % len(seed_pages)])
+                            pending_links.append((chapter_dir, source, dest))
+                        await loader.add("pages", (
+                            page_id, page_number, os.path.relpath(dest, FILES_ROOT).replace("\\", "/"), chapter_id,
+                        ))
+            if len(pending_links) >= args.batch_size:
+                # Ссылки создаются в потоке, пока идёт COPY следующих пачек
+                link_tasks.append(asyncio.create_task(asyncio.to_thread(_link_all, pending_links)))
+                pending_links = []
+        await loader.flush_all()
+        if pending_links:
+            link_tasks.append(asyncio.create_task(asyncio.to_thread(_link_all, pending_links)))
+        await asyncio.gather(*link_tasks)
+        progress("Комиксы", loader.totals["comics"], started)
+        progress("Страницы", loader.totals["pages"], started)
+
+        started = time.perf_counter()
+        comic_zipf = Zipf(args.comics, args.zipf, rng)
+        # Популярность не совпадает с порядком id
+        popularity = list(range(1, args.comics + 1))
+        rng.shuffle(popularity)
+        rating_id = 0
+        per_user_ratings = args.ratings / args.users
+        per_user_favorites = args.favorites / args.users
+        cap = max(1, args.comics // 10)
+        now = datetime.now(timezone.utc)
+        # Время событий равномерно за последний квартал периода, как у комментариев
+        event_span = DATE_SPAN_DAYS * 86400 // 4
+        for user_id in range(1, args.users + 1):
+            for index in comic_zipf.distinct(long_tail(rng, per_user_ratings, cap)):
+                rating_id += 1
+                value = rng.choices(range(11), weights=RATING_WEIGHTS)[0]
+                await loader.add("ratings", (
+                    rating_id, user_id, popularity[index], value,
+                    now - timedelta(seconds=rng.randrange(event_span)),
+                ))
+            for index in comic_zipf.distinct(long_tail(rng, per_user_favorites, cap)):
+                await loader.add("user_favorite_comics", (
+                    user_id, popularity[index], now - timedelta(seconds=rng.randrange(event_span)),
+                ))
+        await loader.flush_all()
+        progress("Оценки", loader.totals["ratings"], started)
+        progress("Избранное", loader.totals["user_favorite_comics"], started)
+
+        started = time.perf_counter()
+        for comment_id in range(1, args.comments + 1):
+            await loader.add("comments", (
+                comment_id,
+                rng.randint(1, args.users),
+                popularity[comic_zipf.sample()],
+                " ".join(rng.choices(WORDS, k=rng.randint(3, 20)))[:255],
+                now - timedelta(seconds=rng.randrange(event_span)),
+            ))
+        await loader.flush_all()
+        progress("Комментарии", loader.totals["comments"], started)
+
+        started = time.perf_counter()
+        await fix_sequences(session)
+        await comic_stats.rebuild_comic_stats(session)
+        await author_stats.rebuild_author_stats(session)
+        await session.execute(text(
+            "INSERT INTO favorite_events (user_id, comic_id, created_at) "
+            "SELECT user_id, comic_id, created_at FROM user_favorite_comics"
+        ))
+        await trending.rebuild(session)
+        await session.commit()
+        progress("Агрегаты", args.comics, started)
+
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("ANALYZE"))
+    await engine.dispose()
+
+
+def _link_all(links):
+    made = set()
+    for folder, source, dest in links:
+        if folder not in made:
+            os.makedirs(folder, exist_ok=True)
+            made.add(folder)
+        link_file(source, dest)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересоздаёт схему и заполняет её синтетическими данными")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--authors", type=int, default=5_000)
+    parser.add_argument("--genres", type=int, default=len(GENRES))
+    parser.add_argument("--comics", type=int, default=100_000)
+    parser.add_argument("--volumes-mean", type=float, default=3.0)
+    parser.add_argument("--chapters-mean", type=float, default=4.0)
+    parser.add_argument("--pages-mean", type=float, default=8.0)
+    parser.add_argument("--ratings", type=int, default=5_000_000)
+    parser.add_argument("--favorites", type=int, default=2_000_000)
+    parser.add_argument("--comments", type=int, default=1_000_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="показатель распределения популярности")
+    parser.add_argument("--password", default="password", help="пароль всех пользователей")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--no-files", dest="files", action="store_false", help="не создавать ссылки на картинки")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(generate(parser.parse_args()))
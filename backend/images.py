@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+from PIL import Image, ImageOps
+from sqlalchemy import select, exists, insert
+from database import AsyncSessionLocal
+from config import settings
+import models as m
+import comic_detail
+
+FILES_ROOT = "files"
+VARIANTS_DIR = "_v"
+
+logger = logging.getLogger("comics.images")
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _render_variants(src_path: str, widths: List[int], formats: List[str], quality: int) -> List[dict]:
+    # Выполняется в процессе пула: уменьшенные копии в современных форматах
+    # рядом с оригиналом, в подпапке _v: 1.jpg -> _v/1.480.webp
+    Image.init()
+    formats = [fmt for fmt in formats if fmt.upper() in Image.SAVE]
+    variants = []
+    with Image.open(src_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGB")
+
+        out_dir = os.path.join(os.path.dirname(src_path), VARIANTS_DIR)
+        os.makedirs(out_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(src_path))[0]
+
+        sizes = sorted({w for w in widths if w < image.width} | {image.width})
+        for width in sizes:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for fmt in formats:
+                path = os.path.join(out_dir, f"{stem}.{width}.{fmt}")
+                tmp_path = f"{path}.part"
+                resized.save(tmp_path, format=fmt.upper(), quality=quality)
+                os.replace(tmp_path, path)
+                variants.append({"width": width, "height": height, "format": fmt, "path": path})
+    return variants
+
+
+async def render_variants(image_url: str, widths: List[int]) -> List[dict]:
+    src_path = os.path.join(FILES_ROOT, image_url)
+    loop = asyncio.get_running_loop()
+    variants = await loop.run_in_executor(
+        _get_executor(),
+        _render_variants,
+        src_path,
+        widths,
+        settings.IMAGE_VARIANT_FORMATS,
+        settings.IMAGE_QUALITY,
+    )
+    for variant in variants:
+        variant["url"] = os.path.relpath(variant.pop("path"), FILES_ROOT).replace("\\", "/")
+    return variants
+
+
+async def _render_rows(items, widths: List[int], owner_field: str) -> List[dict]:
+    rows = []
+    results = await asyncio.gather(
+        *(render_variants(image_url, widths) for _, image_url in items),
+        return_exceptions=True,
+    )
+    for (owner_id, image_url), variants in zip(items, results):
+        if isinstance(variants, Exception):
+            logger.warning("Не удалось обработать %s: %r", image_url, variants)
+            continue
+        rows.extend({owner_field: owner_id, **variant} for variant in variants)
+    return rows
+
+
+async def _fetch(stmt) -> list:
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(stmt)
+        return result.all()
+
+
+async def _save_rows(rows: List[dict]):
+    async with AsyncSessionLocal() as session:
+        await session.execute(insert(m.ImageVariant), rows)
+        await session.commit()
+
+
+async def create_page_variants(page_ids: List[int]):
+    # Запускается фоновой задачей после загрузки страниц. Пока пул процессов
+    # рендерит, соединение с базой не занято: выборка и вставка — в своих
+    # коротких сессиях
+    items = await _fetch(select(m.Page.id, m.Page.image_url).where(m.Page.id.in_(page_ids)))
+    rows = await _render_rows(items, settings.IMAGE_PAGE_WIDTHS, "page_id")
+    if rows:
+        await _save_rows(rows)
+
+
+async def create_poster_variants(comic_id: int):
+    items = await _fetch(select(m.Comic.id, m.Comic.img).where(m.Comic.id == comic_id))
+    rows = await _render_rows(items, settings.IMAGE_POSTER_WIDTHS, "comic_id")
+    if rows:
+        await _save_rows(rows)
+        comic_detail.invalidate(comic_id)
+
+
+async def backfill(batch_size: int = 100):
+    # Досоздаёт варианты для уже загруженных постеров и страниц
+    last_id = 0
+    while True:
+        comics = await _fetch(
+            select(m.Comic.id, m.Comic.img)
+            .where(
+                m.Comic.id > last_id,
+                m.Comic.img != "",
+                ~exists().where(m.ImageVariant.comic_id == m.Comic.id),
+            )
+            .order_by(m.Comic.id)
+            .limit(batch_size)
+        )
+        if not comics:
+            break
+        rows = await _render_rows(comics, settings.IMAGE_POSTER_WIDTHS, "comic_id")
+        if rows:
+            await _save_rows(rows)
+        last_id = comics[-1][0]
+        print(f"Постеры: обработано до id={last_id}")
+
+    last_id = 0
+    while True:
+        pages = await _fetch(
+            select(m.Page.id, m.Page.image_url)
+            .where(
+                m.Page.id > last_id,
+                ~exists().where(m.ImageVariant.page_id == m.Page.id),
+            )
+            .order_by(m.Page.id)
+            .limit(batch_size)
+        )
+        if not pages:
+            break
+        rows = await _render_rows(pages, settings.IMAGE_PAGE_WIDTHS, "page_id")
+        if rows:
+            await _save_rows(rows)
+        last_id = pages[-1][0]
+        print(f"Страницы: обработано до id={last_id}")
+    shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(backfill())
@@ -0,0 +1,21 @@
+import asyncio
+import sys
+import time
+from database import AsyncSessionLocal
+import comic_stats
+
+async def main(path: str):
+    started = time.perf_counter()
+    with open(path, newline="", encoding="utf-8") as f:
+        async with AsyncSessionLocal() as session:
+            report = await comic_stats.import_ratings(session, comic_stats.csv_rating_batches(f))
+            await session.commit()
+    elapsed = time.perf_counter() - started
+    rate = report["received"] / elapsed if elapsed else 0
+    print(f"{report} за {elapsed:.1f} с ({rate:.0f} строк/с)")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Использование: python import_ratings.py ratings.csv")
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1]))
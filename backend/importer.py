@@ -0,0 +1,317 @@
+import argparse
+import asyncio
+import os
+import re
+import shutil
+import sys
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import Callable, List, NamedTuple, Optional
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, func, insert
+from database import AsyncSessionLocal, engine
+from cache import TTLCache
+from config import settings
+import models as m
+import storage
+import comic_detail
+import images
+
+# Импорт томов, глав и страниц из CBZ/ZIP или дерева каталогов:
+#   python importer.py 42 back_catalog.cbz
+#   python importer.py 42 ./scans/
+# и POST /api/create/comics/{id}/import. Элементы архива копируются в
+# хранилище по одному, без распаковки во временный каталог. Структура
+# берётся из путей: "Vol 2/Chapter 5/003.jpg", "v02/c005/3.png", "ch5/3.jpg"
+# (том 1) или просто "3.jpg" (том 1, глава 1). Тома дописываются после уже
+# существующих, главы и страницы нумеруются подряд в естественном порядке
+# имён. Все строки вставляются пачками в одной короткой транзакции после
+# копирования; при ошибке записанные файлы удаляются.
+
+FILES_ROOT = "files"
+COMICS_ROOT = os.path.join(FILES_ROOT, "comics")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+# Страниц на одну фоновую задачу вариантов
+VARIANT_BATCH = 500
+
+VOLUME_RE = re.compile(r"(?:^|[^a-zа-яё])(?:volume|vol|vl|v|том|т)[\s._-]*(\d+)", re.IGNORECASE)
+CHAPTER_RE = re.compile(r"(?:^|[^a-zа-яё])(?:chapter|ch|c|глава|гл)[\s._-]*(\d+)", re.IGNORECASE)
+NUMBER_RE = re.compile(r"\d+")
+
+# Ход импорта по import_id для GET /create/imports/{import_id};
+# хранится в памяти процесса, который выполняет импорт
+progress_cache = TTLCache(maxsize=1024, ttl=3600)
+
+
+class Entry(NamedTuple):
+    name: str
+    size: int
+    open: Callable
+
+
+@dataclass
+class ImportProgress:
+    stage: str = "planning"
+    pages_total: int = 0
+    pages_done: int = 0
+    bytes_total: int = 0
+    bytes_done: int = 0
+
+
+def _natural_key(name: str):
+    return tuple(
+        (0, int(part), "") if part.isdigit() else (1, 0, part.lower()) for part in re.split(r"(\d+)", name)
+    )
+
+
+def _is_image(name: str) -> bool:
+    parts = name.split("/")
+    if any(part.startswith(".") or part == "__MACOSX" for part in parts):
+        return False
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+
+
+def zip_entries(archive: zipfile.ZipFile) -> List[Entry]:
+    return [
+        Entry(info.filename, info.file_size, lambda info=info: archive.open(info))
+        for info in archive.infolist()
+        if not info.is_dir() and _is_image(info.filename)
+    ]
+
+
+def directory_entries(root: str) -> List[Entry]:
+    entries = []
+    for folder, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(folder, name)
+            relative = os.path.relpath(path, root).replace("\\", "/")
+            if _is_image(relative):
+                entries.append(Entry(relative, os.path.getsize(path), lambda path=path: open(path, "rb")))
+    return entries
+
+
+def _locate(name: str):
+    # (номер тома, номер главы) по каталогам пути; None — не указан.
+    # Сначала ищутся явные метки (vol, ch, том, глава) — в одном каталоге
+    # могут быть обе, как в "Vol.01 Ch.003", — затем номера в остальных
+    # каталогах: ближайший к файлу — глава, следующий — том.
+    folders = name.split("/")[:-1]
+    volume = chapter = None
+    unlabeled = []
+    for folder in reversed(folders):
+        chapter_match = CHAPTER_RE.search(folder)
+        volume_match = VOLUME_RE.search(folder)
+        if chapter_match and chapter is None:
+            chapter = int(chapter_match.group(1))
+        if volume_match and volume is None:
+            volume = int(volume_match.group(1))
+        if not chapter_match and not volume_match and (match := NUMBER_RE.search(folder)):
+            unlabeled.append(int(match.group()))
+    for number in unlabeled:
+        if chapter is None:
+            chapter = number
+        elif volume is None:
+            volume = number
+    return volume, chapter
+
+
+def plan(entries: List[Entry], first_volume: int = 1) -> List[dict]:
+    # [{"number", "chapters": [{"number", "pages": [Entry]}]}]; тома
+    # нумеруются с first_volume, главы в томе и страницы в главе — с 1
+    if not entries:
+        raise HTTPException(status_code=400, detail="В архиве нет изображений")
+    if len(entries) > settings.IMPORT_MAX_PAGES:
+        raise HTTPException(status_code=413, detail=f"Больше {settings.IMPORT_MAX_PAGES} страниц")
+
+    volumes: dict = {}
+    for entry in entries:
+        volume, chapter = _locate(entry.name)
+        folder = entry.name.rpartition("/")[0]
+        # Каталоги с одинаковыми номерами ("ch1" и "Ch 01") остаются разными главами
+        chapters = volumes.setdefault(volume or 0, {})
+        chapters.setdefault((chapter or 0, _natural_key(folder)), []).append(entry)
+
+    layout = []
+    for volume_index, volume_key in enumerate(sorted(volumes), start=first_volume):
+        chapters = volumes[volume_key]
+        layout.append({
+            "number": volume_index,
+            "chapters": [
+                {"number": number, "pages": sorted(chapters[key], key=lambda e: _natural_key(e.name))}
+                for number, key in enumerate(sorted(chapters), start=1)
+            ],
+        })
+    return layout
+
+
+def _move_all(moves):
+    for src, dest in moves:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(src, dest)
+
+
+async def import_pages(db, comic_id: int, entries: List[Entry], progress: Optional[ImportProgress] = None) -> dict:
+    # Файлы сначала копируются в скрытый каталог импорта без открытой
+    # транзакции. Номера томов выдаются в короткой транзакции под
+    # FOR NO KEY UPDATE на комикс (не мешает проверкам внешних ключей
+    # в оценках и комментариях): там файлы переносятся в vlN/chK и
+    # вставляются строки.
+    progress = progress or ImportProgress()
+    title = await db.scalar(select(m.Comic.title).where(m.Comic.id == comic_id))
+    # Соединение возвращается в пул на время копирования
+    await db.rollback()
+    if title is None:
+        raise HTTPException(status_code=404, detail="Комикс не найден")
+    layout = plan(entries)
+
+    progress.stage = "copying"
+    progress.pages_total = len(entries)
+    progress.bytes_total = sum(entry.size for entry in entries)
+    comic_folder = os.path.join(COMICS_ROOT, title.replace(" ", "_"), "comic")
+    staging = os.path.join(comic_folder, f".import-{time.time_ns()}")
+    budget = storage.UploadBudget(settings.IMPORT_MAX_BYTES)
+    saved_paths = []
+    # (индекс тома, номер главы) -> [(номер страницы, путь в staging)]
+    staged = {}
+    try:
+        for volume_index, volume in enumerate(layout):
+            for chapter in volume["chapters"]:
+                chapter_folder = os.path.join(staging, str(volume_index), str(chapter["number"]))
+                await storage.makedirs(chapter_folder)
+                stored = staged[volume_index, chapter["number"]] = []
+                for page_number, entry in enumerate(chapter["pages"], start=1):
+                    extension = os.path.splitext(entry.name)[1].lower()
+                    path = os.path.join(chapter_folder, f"{page_number}{extension}")
+                    path = await storage.save_stream(entry.open, path, budget)
+                    saved_paths.append(path)
+                    stored.append((page_number, path))
+                    progress.pages_done += 1
+                    progress.bytes_done += entry.size
+
+        progress.stage = "saving"
+        locked = await db.scalar(
+            select(m.Comic.id).where(m.Comic.id == comic_id).with_for_update(key_share=True)
+        )
+        if locked is None:
+            raise HTTPException(status_code=404, detail="Комикс удалён во время импорта")
+        last_volume = await db.scalar(select(func.max(m.Volume.number)).where(m.Volume.comic_id == comic_id))
+        first_volume = (last_volume or 0) + 1
+        for volume_index, volume in enumerate(layout):
+            volume["number"] = first_volume + volume_index
+
+        moves = []
+        pages = []
+        for (volume_index, chapter_number), stored in staged.items():
+            chapter_folder = os.path.join(
+                comic_folder, f"vl{first_volume + volume_index}", f"ch{chapter_number}"
+            )
+            for page_number, path in stored:
+                dest = os.path.join(chapter_folder, os.path.basename(path))
+                moves.append((path, dest))
+                pages.append((first_volume + volume_index, chapter_number, page_number, dest))
+        saved_paths.extend(dest for _, dest in moves)
+        await run_in_threadpool(_move_all, moves)
+
+        result = await db.execute(
+            insert(m.Volume).returning(m.Volume.id, m.Volume.number),
+            [{"number": volume["number"], "comic_id": comic_id} for volume in layout],
+        )
+        volume_ids = {number: volume_id for volume_id, number in result.all()}
+        result = await db.execute(
+            insert(m.Chapter).returning(m.Chapter.id, m.Chapter.volume_id, m.Chapter.number),
+            [
+                {"number": chapter["number"], "title": None, "volume_id": volume_ids[volume["number"]]}
+                for volume in layout
+                for chapter in volume["chapters"]
+            ],
+        )
+        volume_numbers = {volume_id: number for number, volume_id in volume_ids.items()}
+        chapter_ids = {
+            (volume_numbers[volume_id], number): chapter_id for chapter_id, volume_id, number in result.all()
+        }
+        result = await db.execute(
+            insert(m.Page).returning(m.Page.id),
+            [
+                {
+                    "number": page_number,
+                    "image_url": os.path.relpath(path, FILES_ROOT).replace("\\", "/"),
+                    "chapter_id": chapter_ids[volume_number, chapter_number],
+                }
+                for volume_number, chapter_number, page_number, path in pages
+            ],
+        )
+        page_ids = result.scalars().all()
+        await db.commit()
+    except BaseException:
+        progress.stage = "failed"
+        await db.rollback()
+        await storage.remove_files(saved_paths)
+        raise
+    finally:
+        await run_in_threadpool(shutil.rmtree, staging, True)
+
+    progress.stage = "done"
+    comic_detail.invalidate(comic_id)
+    return {
+        "volumes": [volume["number"] for volume in layout],
+        "chapters": len(chapter_ids),
+        "pages": len(page_ids),
+        "page_ids": page_ids,
+    }
+
+
+async def create_variants(page_ids: List[int]):
+    for start in range(0, len(page_ids), VARIANT_BATCH):
+        await images.create_page_variants(page_ids[start:start + VARIANT_BATCH])
+
+
+async def _report(progress: ImportProgress, started: float):
+    while True:
+        await asyncio.sleep(2)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{progress.stage}: {progress.pages_done}/{progress.pages_total} страниц, "
+            f"{progress.bytes_done / 2**20:.0f}/{progress.bytes_total / 2**20:.0f} МБ за {elapsed:.0f} с"
+        )
+
+
+async def main(args):
+    started = time.perf_counter()
+    progress = ImportProgress()
+    reporter = asyncio.create_task(_report(progress, started))
+    archive = None
+    try:
+        if os.path.isdir(args.source):
+            entries = directory_entries(args.source)
+        else:
+            archive = zipfile.ZipFile(args.source)
+            entries = zip_entries(archive)
+        async with AsyncSessionLocal() as session:
+            summary = await import_pages(session, args.comic_id, entries, progress)
+        if not args.no_variants:
+            progress.stage = "variants"
+            await create_variants(summary["page_ids"])
+    except HTTPException as exc:
+        print(f"Ошибка: {exc.detail}")
+        return 1
+    finally:
+        reporter.cancel()
+        if archive is not None:
+            archive.close()
+        images.shutdown()
+        await engine.dispose()
+    print(
+        f"Тома {summary['volumes']}, глав {summary['chapters']}, страниц {summary['pages']} "
+        f"за {time.perf_counter() - started:.1f} с"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("comic_id", type=int)
+    parser.add_argument("source", help="CBZ/ZIP-архив или каталог")
+    parser.add_argument("--no-variants", action="store_true", help="не создавать уменьшенные копии страниц")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import select, update, delete, union_all
+from database import AsyncSessionLocal, engine
+from config import settings
+import models as m
+
+logger = logging.getLogger("comics.jobs")
+
+# Очередь файловых задач в таблице jobs. Обработчик запроса добавляет задачу
+# в ту же транзакцию, что и изменение в базе, и отвечает сразу после коммита;
+# создают и удаляют каталоги воркеры (start() при запуске приложения).
+# Задача берётся в аренду на JOBS_LEASE_SECONDS через FOR UPDATE SKIP LOCKED:
+# если процесс умер, её возьмёт другой воркер. Поэтому все задачи
+# идемпотентны — повторное выполнение ничего не ломает.
+#   python jobs.py run                 выполнить всё, что накопилось
+#   python jobs.py reconcile [--delete] найти файлы, на которые нет ссылок
+#   python jobs.py retry               вернуть в очередь задачи со статусом failed
+
+FILES_ROOT = "files"
+COMICS_ROOT = os.path.join(FILES_ROOT, "comics")
+# Путей в одной задаче remove_files от сверки
+REMOVE_BATCH = 1000
+
+HANDLERS: dict[str, Callable] = {}
+
+_wakeup: Optional[asyncio.Event] = None
+_tasks: list[asyncio.Task] = []
+
+
+def handler(kind: str):
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def _checked(path: str) -> str:
+    # Задачи трогают только содержимое каталога комиксов
+    root = os.path.abspath(COMICS_ROOT)
+    full = os.path.abspath(path)
+    if full == root or os.path.commonpath([root, full]) != root:
+        raise ValueError(f"Путь вне {COMICS_ROOT}: {path}")
+    return full
+
+
+@handler("makedirs")
+def _makedirs(paths: list):
+    for path in paths:
+        os.makedirs(_checked(path), exist_ok=True)
+
+
+@handler("rmtree")
+def _rmtree(path: str):
+    # Прерванное удаление продолжится при повторе
+    try:
+        shutil.rmtree(_checked(path))
+    except FileNotFoundError:
+        pass
+
+
+@handler("remove_files")
+def _remove_files(paths: list, prune: bool = False):
+    # prune: убрать опустевшие каталоги, где лежали файлы
+    folders = set()
+    for path in paths:
+        path = _checked(path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        folders.add(os.path.dirname(path))
+    if prune:
+        for folder in sorted(folders, key=len, reverse=True):
+            with contextlib.suppress(OSError):
+                os.rmdir(folder)
+
+
+def enqueue(db, kind: str, **payload):
+    # Задача станет видна воркерам вместе с коммитом db; после коммита
+    # стоит вызвать wake(), чтобы не ждать очередного опроса
+    if kind not in HANDLERS:
+        raise ValueError(f"Неизвестная задача {kind}")
+    db.add(m.Job(kind=kind, payload=payload, run_after=_now()))
+
+
+def wake():
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def trash_path(path: str) -> str:
+    # Соседнее имя на той же файловой системе: переименование после коммита
+    # мгновенное, и новый том или глава с тем же номером не попадут под
+    # удаление. Каталог удаляет задача rmtree; если процесс умер до
+    # переименования, оставшиеся файлы найдёт reconcile.
+    return f"{path}.deleted-{time.time_ns()}"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _claim(db):
+    now = _now()
+    job = await db.scalar(
+        select(m.Job)
+        .where(m.Job.status == "pending", m.Job.run_after <= now)
+        .order_by(m.Job.run_after, m.Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    if job is None:
+        return None
+    job.attempts += 1
+    job.run_after = now + timedelta(seconds=settings.JOBS_LEASE_SECONDS)
+    claimed = (job.id, job.kind, job.payload, job.attempts)
+    await db.commit()
+    return claimed
+
+
+async def _finish(job_id: int, kind: str, attempts: int, error: Optional[Exception]):
+    async with AsyncSessionLocal() as db:
+        if error is None:
+            await db.execute(delete(m.Job).where(m.Job.id == job_id))
+        elif attempts >= settings.JOBS_MAX_ATTEMPTS:
+            logger.error("Задача %s #%d не выполнена после %d попыток: %r", kind, job_id, attempts, error)
+            await db.execute(
+                update(m.Job).where(m.Job.id == job_id).values(status="failed", last_error=repr(error))
+            )
+        else:
+            delay = settings.JOBS_RETRY_SECONDS * 2 ** (attempts - 1)
+            logger.warning("Задача %s #%d, попытка %d: %r", kind, job_id, attempts, error)
+            await db.execute(
+                update(m.Job).where(m.Job.id == job_id).values(
+                    run_after=_now() + timedelta(seconds=delay), last_error=repr(error)
+                )
+            )
+        await db.commit()
+
+
+async def run_one() -> bool:
+    # Выполняет одну готовую задачу; False, если очередь пуста
+    async with AsyncSessionLocal() as db:
+        claimed = await _claim(db)
+    if claimed is None:
+        return False
+    job_id, kind, payload, attempts = claimed
+    error = None
+    try:
+        await asyncio.to_thread(HANDLERS[kind], **payload)
+    except Exception as exc:
+        error = exc
+    await _finish(job_id, kind, attempts, error)
+    return True
+
+
+async def _worker():
+    while True:
+        try:
+            if await run_one():
+                continue
+        except Exception:
+            logger.exception("Ошибка очереди задач")
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(_wakeup.wait(), settings.JOBS_POLL_SECONDS)
+        _wakeup.clear()
+
+
+def start():
+    global _wakeup
+    if _tasks or settings.JOBS_WORKERS <= 0:
+        return
+    _wakeup = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    _tasks.extend(loop.create_task(_worker()) for _ in range(settings.JOBS_WORKERS))
+
+
+async def stop():
+    # Прерванная задача вернётся в очередь по истечении аренды
+    for task in _tasks:
+        task.cancel()
+    for task in _tasks:
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    _tasks.clear()
+
+
+def _relative(path: str) -> str:
+    return os.path.relpath(path, FILES_ROOT).replace("\\", "/")
+
+
+def _old_files(folder: str, cutoff: float) -> list:
+    found = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            path = os.path.join(root, name)
+            with contextlib.suppress(FileNotFoundError):
+                if os.lstat(path).st_mtime < cutoff:
+                    found.append(path)
+    return found
+
+
+def _list_dirs(folder: str) -> list:
+    try:
+        return sorted(entry.name for entry in os.scandir(folder) if entry.is_dir(follow_symlinks=False))
+    except FileNotFoundError:
+        return []
+
+
+async def _referenced(db, comic_id: int) -> set:
+    # Все пути, на которые ссылается комикс: постер, страницы и их варианты
+    pages = (
+        select(m.Page.id, m.Page.image_url)
+        .join(m.Chapter, m.Chapter.id == m.Page.chapter_id)
+        .join(m.Volume, m.Volume.id == m.Chapter.volume_id)
+        .where(m.Volume.comic_id == comic_id)
+        .subquery()
+    )
+    result = await db.execute(union_all(
+        select(m.Comic.img).where(m.Comic.id == comic_id),
+        select(m.ImageVariant.url).where(m.ImageVariant.comic_id == comic_id),
+        select(pages.c.image_url),
+        select(m.ImageVariant.url).join(pages, pages.c.id == m.ImageVariant.page_id),
+    ))
+    return {url for url in result.scalars() if url}
+
+
+async def find_orphans(db, min_age: float) -> dict:
+    # Файлы старше min_age, на которые не ссылается ни одна строка:
+    # {папка комикса: [пути]}. Папка без комикса в базе осиротела целиком.
+    result = await db.execute(select(m.Comic.id, m.Comic.title))
+    by_folder = {title.replace(" ", "_"): comic_id for comic_id, title in result.all()}
+    cutoff = time.time() - min_age
+    orphans = {}
+    for folder in await asyncio.to_thread(_list_dirs, COMICS_ROOT):
+        comic_id = by_folder.get(folder)
+        referenced = await _referenced(db, comic_id) if comic_id is not None else set()
+        files = await asyncio.to_thread(_old_files, os.path.join(COMICS_ROOT, folder), cutoff)
+        unreferenced = [path for path in files if _relative(path) not in referenced]
+        if unreferenced:
+            orphans[folder] = unreferenced
+    return orphans
+
+
+async def reconcile(remove: bool, min_age: float):
+    async with AsyncSessionLocal() as db:
+        orphans = await find_orphans(db, min_age)
+        total = sum(len(paths) for paths in orphans.values())
+        for folder, paths in orphans.items():
+            print(f"{folder}: {len(paths)} файлов без ссылок")
+            if remove:
+                for start in range(0, len(paths), REMOVE_BATCH):
+                    enqueue(db, "remove_files", paths=paths[start:start + REMOVE_BATCH], prune=True)
+        await db.commit()
+    action = "поставлено на удаление" if remove else "найдено"
+    print(f"Всего {action}: {total} файлов")
+
+
+async def run_all():
+    done = 0
+    while await run_one():
+        done += 1
+    print(f"Выполнено задач: {done}")
+
+
+async def retry_failed():
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(m.Job).where(m.Job.status == "failed").values(status="pending", attempts=0, run_after=_now())
+        )
+        await db.commit()
+    print(f"Возвращено в очередь: {result.rowcount}")
+
+
+async def main(args):
+    if args.command == "run":
+        await run_all()
+    elif args.command == "reconcile":
+        await reconcile(args.delete, args.min_age)
+    else:
+        await retry_failed()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["run", "reconcile", "retry"])
+    parser.add_argument("--delete", action="store_true", help="reconcile: поставить найденные файлы на удаление")
+    parser.add_argument(
+        "--min-age", type=float, default=settings.JOBS_ORPHAN_MIN_AGE_SECONDS,
+        help="reconcile: не трогать файлы моложе, секунд",
+    )
+    asyncio.run(main(parser.parse_args()))
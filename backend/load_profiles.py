@@ -0,0 +1,50 @@
+# Профили загрузки: каждый эндпоинт явно говорит, какие колонки и связи ему нужны.
+# Связи в models.py ленивые, поэтому всё, что не указано здесь, не загружается.
+from sqlalchemy.orm import load_only, joinedload, selectinload, contains_eager, noload
+import models as m
+
+CARD_COLUMNS = (
+    m.Comic.id,
+    m.Comic.title,
+    m.Comic.desc,
+    m.Comic.date_of_out,
+    m.Comic.website_recommendation,
+    m.Comic.img,
+)
+
+# Карточка комикса (pyd.ComicBase): колонки, агрегат оценок и размеры постера
+CARD = (
+    load_only(*CARD_COLUMNS),
+    joinedload(m.Comic.stats),
+    selectinload(m.Comic.poster_variants),
+)
+
+# Карточка в запросах, которые уже сделали JOIN comic_stats для сортировки/фильтра
+CARD_JOINED_STATS = (
+    load_only(*CARD_COLUMNS),
+    contains_eager(m.Comic.stats),
+    selectinload(m.Comic.poster_variants),
+)
+
+# Страница комикса (pyd.ComicResponse): автор, жанры, тома и главы без страниц
+DETAIL = (
+    joinedload(m.Comic.stats),
+    joinedload(m.Comic.user),
+    selectinload(m.Comic.poster_variants),
+    selectinload(m.Comic.genres),
+    selectinload(m.Comic.volumes)
+    .selectinload(m.Volume.chapters)
+    .options(noload(m.Chapter.pages)),
+)
+
+# Читалка (pyd.PageResponse): страницы главы и их размеры
+READER = (
+    load_only(m.Page.id, m.Page.number, m.Page.image_url),
+    selectinload(m.Page.variants),
+)
+
+# Список комиксов в sqladmin: только колонки из ComicAdmin.column_list
+ADMIN_LIST = (
+    load_only(m.Comic.id, m.Comic.title, m.Comic.website_recommendation),
+    noload(m.Comic.stats),
+)
@@ -1,12 +1,17 @@
 import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from static import ComicStaticFiles
 from routers import *
 from admin import setup_admin
-from database import engine, Base
+from database import engine, replicas
 from starlette.middleware.sessions import SessionMiddleware
 from config import settings
+import images
+import migrate
+import metrics
+import trending
+import jobs
 
 app = FastAPI()
 
@@ -21,15 +26,28 @@ app.add_middleware(
 setup_admin(app)
 
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+# Последним, чтобы время ответа включало остальные middleware
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.install_sql_hooks()
+app.add_route("/metrics", metrics.metrics_endpoint, include_in_schema=False)
 
 @app.on_event("startup")
 async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    await migrate.upgrade()
+    trending.start()
+    jobs.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await trending.stop()
+    await jobs.stop()
+    images.shutdown()
+    await replicas.dispose()
+    await engine.dispose()
         
 app.mount(
     "/comics",
-    StaticFiles(directory=os.path.join("files", "comics")),
+    ComicStaticFiles(directory=os.path.join("files", "comics")),
     name="comics"
 )
 
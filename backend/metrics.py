@@ -0,0 +1,227 @@
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+from config import settings
+from database import engine, replicas
+from cache import response_cache
+import auth
+import utils
+
+logger = logging.getLogger("comics.slow")
+
+# Границы гистограмм: секунды для времени ответа, штуки для числа запросов к БД
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_seconds", "rows", "log")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        # (секунды, SQL) для журнала медленных запросов
+        self.log: list = []
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.statements_per_request = Histogram(STATEMENT_BUCKETS)
+        self.statuses: dict[int, int] = {}
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+
+
+# (метод, шаблон пути) -> RouteMetrics
+routes: dict[tuple, RouteMetrics] = {}
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_seconds += elapsed
+    stats.rows += max(cursor.rowcount or 0, 0)
+    if len(stats.log) < settings.SLOW_REQUEST_MAX_STATEMENTS:
+        stats.log.append((elapsed, statement))
+
+
+def install_sql_hooks():
+    for target in [engine, *replicas.engines]:
+        event.listen(target.sync_engine, "before_cursor_execute", _before_execute)
+        event.listen(target.sync_engine, "after_cursor_execute", _after_execute)
+
+
+def _route_path(app, scope: Scope) -> str:
+    # Шаблон пути (/api/comic/comics/{comic_id}), а не сам путь —
+    # иначе у метрик будет по серии на каждый id
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - started
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.statements} queries", '
+                    f"app;dur={elapsed * 1000:.1f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            self._record(scope, status_code, elapsed, stats)
+
+    def _record(self, scope: Scope, status_code: int, elapsed: float, stats: RequestStats):
+        path = _route_path(scope["app"], scope)
+        key = (scope["method"], path)
+        metrics = routes.get(key)
+        if metrics is None:
+            metrics = routes[key] = RouteMetrics()
+        metrics.latency.observe(elapsed)
+        metrics.statements_per_request.observe(stats.statements)
+        metrics.statuses[status_code] = metrics.statuses.get(status_code, 0) + 1
+        metrics.statements += stats.statements
+        metrics.db_seconds += stats.db_seconds
+        metrics.rows += stats.rows
+
+        if elapsed >= settings.SLOW_REQUEST_SECONDS:
+            lines = "\n".join(
+                f"  {seconds * 1000:8.1f} ms  {' '.join(statement.split())[:500]}"
+                for seconds, statement in stats.log
+            )
+            logger.warning(
+                "Медленный запрос %s %s: %.0f ms, %d SQL (%.0f ms), %d строк\n%s",
+                scope["method"], scope["path"], elapsed * 1000,
+                stats.statements, stats.db_seconds * 1000, stats.rows, lines,
+            )
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, histogram: Histogram, **labels) -> list:
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+    lines.append(f'{name}_bucket{_labels(**labels, le="+Inf")} {histogram.count}')
+    lines.append(f"{name}_sum{_labels(**labels)} {histogram.sum}")
+    lines.append(f"{name}_count{_labels(**labels)} {histogram.count}")
+    return lines
+
+
+def render() -> str:
+    # Строки одного семейства метрик должны идти подряд
+    items = sorted(routes.items())
+    lines = ["# TYPE http_request_duration_seconds histogram"]
+    for (method, path), metrics in items:
+        lines += _histogram_lines("http_request_duration_seconds", metrics.latency, method=method, route=path)
+    lines.append("# TYPE http_requests_total counter")
+    for (method, path), metrics in items:
+        for status_code, count in sorted(metrics.statuses.items()):
+            lines.append(f"http_requests_total{_labels(method=method, route=path, status=status_code)} {count}")
+    lines.append("# TYPE db_statements_per_request histogram")
+    for (method, path), metrics in items:
+        lines += _histogram_lines("db_statements_per_request", metrics.statements_per_request, method=method, route=path)
+    for name, field in (
+        ("db_statements_total", "statements"),
+        ("db_seconds_total", "db_seconds"),
+        ("db_rows_total", "rows"),
+    ):
+        lines.append(f"# TYPE {name} counter")
+        for (method, path), metrics in items:
+            lines.append(f"{name}{_labels(method=method, route=path)} {getattr(metrics, field)}")
+
+    caches = [("response", response_cache.stats()), ("user", auth.user_cache.stats())]
+    for name, field, kind in (
+        ("cache_hits_total", "hits", "counter"),
+        ("cache_misses_total", "misses", "counter"),
+        ("cache_entries", "size", "gauge"),
+    ):
+        lines.append(f"# TYPE {name} {kind}")
+        for cache_name, cache_stats in caches:
+            lines.append(f"{name}{_labels(cache=cache_name)} {cache_stats[field]}")
+
+    lines += [
+        "# TYPE password_hash_calls_total counter",
+        f"password_hash_calls_total {utils.hash_metrics['calls']}",
+        "# TYPE password_hash_rejected_total counter",
+        f"password_hash_rejected_total {utils.hash_metrics['rejected']}",
+        "# TYPE password_hash_seconds_total counter",
+        f"password_hash_seconds_total {utils.hash_metrics['seconds_total']}",
+        "# TYPE password_hash_seconds_max gauge",
+        f"password_hash_seconds_max {utils.hash_metrics['seconds_max']}",
+        "# TYPE password_hash_queue_depth gauge",
+        f"password_hash_queue_depth {utils.hash_queue_depth()}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_endpoint(request: Request):
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
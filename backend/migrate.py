@@ -0,0 +1,115 @@
+import asyncio
+import importlib
+import pkgutil
+import sys
+from sqlalchemy import Table, Column, Integer, String, DateTime, func, select, delete, text
+from database import engine, Base
+import migrations
+
+# Версионированные миграции схемы. Каждый модуль migrations/vNNNN_*.py задаёт
+# async upgrade(conn) и, по желанию, async downgrade(conn). Модули с
+# TRANSACTIONAL = False выполняются в autocommit (CREATE INDEX CONCURRENTLY).
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(255), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+)
+
+# Ключ pg_advisory_lock: несколько воркеров не мигрируют одновременно
+LOCK_ID = 7312001
+
+
+def discover():
+    found = []
+    for info in pkgutil.iter_modules(migrations.__path__):
+        if info.name.startswith("v") and info.name[1:5].isdigit():
+            module = importlib.import_module(f"migrations.{info.name}")
+            found.append((int(info.name[1:5]), info.name, module))
+    return sorted(found, key=lambda item: item[0])
+
+
+async def _applied_versions() -> set:
+    async with engine.begin() as conn:
+        await conn.run_sync(lambda sync_conn: schema_migrations.create(sync_conn, checkfirst=True))
+        result = await conn.execute(select(schema_migrations.c.version))
+        return set(result.scalars().all())
+
+
+async def _run(module, step, record):
+    if getattr(module, "TRANSACTIONAL", True):
+        async with engine.begin() as conn:
+            await step(conn)
+            await conn.execute(record)
+    else:
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await step(conn)
+            await conn.execute(record)
+
+
+async def _locked(action):
+    async with engine.connect() as lock_conn:
+        postgres = lock_conn.dialect.name == "postgresql"
+        if postgres:
+            await lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": LOCK_ID})
+            await lock_conn.commit()
+        try:
+            await action()
+        finally:
+            if postgres:
+                await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": LOCK_ID})
+                await lock_conn.commit()
+
+
+async def upgrade(target: int = None):
+    async def action():
+        applied = await _applied_versions()
+        for version, name, module in discover():
+            if version in applied or (target is not None and version > target):
+                continue
+            print(f"Миграция {name}")
+            record = schema_migrations.insert().values(version=version, name=name)
+            await _run(module, module.upgrade, record)
+
+    await _locked(action)
+
+
+async def downgrade(target: int):
+    async def action():
+        applied = await _applied_versions()
+        for version, name, module in reversed(discover()):
+            if version not in applied or version <= target:
+                continue
+            if not hasattr(module, "downgrade"):
+                raise RuntimeError(f"Миграция {name} не поддерживает откат")
+            print(f"Откат {name}")
+            record = delete(schema_migrations).where(schema_migrations.c.version == version)
+            await _run(module, module.downgrade, record)
+
+    await _locked(action)
+
+
+async def status():
+    applied = await _applied_versions()
+    for version, name, _ in discover():
+        print(f"{'+' if version in applied else ' '} {name}")
+
+
+if __name__ == "__main__":
+    # python migrate.py            — применить все
+    # python migrate.py up 2       — применить до версии 2 включительно
+    # python migrate.py down 2     — откатить всё новее версии 2
+    # python migrate.py status
+    args = sys.argv[1:]
+    if args and args[0] == "status":
+        asyncio.run(status())
+    elif args and args[0] == "down":
+        asyncio.run(downgrade(int(args[1])))
+    elif args and args[0] == "up":
+        asyncio.run(upgrade(int(args[1]) if len(args) > 1 else None))
+    else:
+        asyncio.run(upgrade())
+    asyncio.run(engine.dispose())
@@ -0,0 +1,41 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Миграции применяются по возрастанию номера (python migrate.py).
+# v0001 — схема первой версии, каждый следующий шаг вносит свои изменения.
+# DDL в шагах записан явно, а не берётся из моделей: модели меняются, а
+# применённый шаг — нет. Шаги идемпотентны, потому что базы, созданные до
+# миграций через create_all, уже содержат часть изменений.
+
+
+async def add_column_if_missing(conn: AsyncConnection, table: str, column: str, ddl: str):
+    columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns(table))
+    if column not in {c["name"] for c in columns}:
+        await conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN "{column}" {ddl}'))
+
+
+async def create_index(conn: AsyncConnection, name: str, table: str, columns: str, using: str = None):
+    if conn.dialect.name != "postgresql":
+        if using is None:
+            await conn.execute(text(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({columns})'))
+        return
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс,
+    # который IF NOT EXISTS пропустил бы
+    valid = await conn.scalar(
+        text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name},
+    )
+    if valid is False:
+        await conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+    using_sql = f" USING {using}" if using else ""
+    await conn.execute(
+        text(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}"{using_sql} ({columns})')
+    )
+
+
+async def drop_index(conn: AsyncConnection, name: str):
+    concurrently = " CONCURRENTLY" if conn.dialect.name == "postgresql" else ""
+    await conn.execute(text(f'DROP INDEX{concurrently} IF EXISTS "{name}"'))
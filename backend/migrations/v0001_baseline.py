@@ -0,0 +1,99 @@
+from sqlalchemy import text
+
+# Схема первой версии приложения, которую создавал create_all при запуске.
+# DDL записан явно и больше не меняется: новые таблицы, колонки и индексы
+# добавляют следующие шаги. IF NOT EXISTS — для баз, созданных до миграций.
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS roles (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR(255) NOT NULL UNIQUE,
+        nick VARCHAR(255) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        "roleId" INTEGER NOT NULL REFERENCES roles (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS genres (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comics (
+        id SERIAL PRIMARY KEY,
+        title VARCHAR(255) NOT NULL UNIQUE,
+        "desc" VARCHAR(255),
+        date_of_out DATE NOT NULL,
+        "userID" INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        website_recommendation BOOLEAN NOT NULL,
+        img VARCHAR(255) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comic_genres (
+        comic_id INTEGER NOT NULL REFERENCES comics (id),
+        genre_id INTEGER NOT NULL REFERENCES genres (id),
+        PRIMARY KEY (comic_id, genre_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_favorite_comics (
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        comic_id INTEGER NOT NULL REFERENCES comics (id) ON DELETE CASCADE,
+        PRIMARY KEY (user_id, comic_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS volumes (
+        id SERIAL PRIMARY KEY,
+        number INTEGER NOT NULL,
+        comic_id INTEGER NOT NULL REFERENCES comics (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chapters (
+        id SERIAL PRIMARY KEY,
+        number INTEGER NOT NULL,
+        title VARCHAR(255),
+        volume_id INTEGER NOT NULL REFERENCES volumes (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS pages (
+        id SERIAL PRIMARY KEY,
+        number INTEGER NOT NULL,
+        image_url VARCHAR(255) NOT NULL,
+        chapter_id INTEGER NOT NULL REFERENCES chapters (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comments (
+        id SERIAL PRIMARY KEY,
+        "userID" INTEGER NOT NULL REFERENCES users (id),
+        comment VARCHAR(255) NOT NULL,
+        "comicID" INTEGER NOT NULL REFERENCES comics (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ratings (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        comic_id INTEGER NOT NULL REFERENCES comics (id),
+        value INTEGER NOT NULL,
+        CONSTRAINT _user_comic_uc UNIQUE (user_id, comic_id)
+    )
+    """,
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
@@ -0,0 +1,53 @@
+from sqlalchemy import text
+from migrations import add_column_if_missing
+
+# Таблицы и колонки, добавленные в модели после первой версии схемы.
+# comic_stats для уже существующих комиксов заполняет v0010.
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS comic_stats (
+        comic_id INTEGER PRIMARY KEY REFERENCES comics (id) ON DELETE CASCADE,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        avg_rating DOUBLE PRECISION
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_comic_stats_avg_rating ON comic_stats (avg_rating DESC NULLS LAST, comic_id DESC)",
+    """
+    CREATE INDEX IF NOT EXISTS ix_comic_stats_popular
+    ON comic_stats (rating_count DESC, avg_rating DESC NULLS LAST, comic_id DESC)
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS comic_rating_histogram (
+        comic_id INTEGER NOT NULL REFERENCES comics (id) ON DELETE CASCADE,
+        value INTEGER NOT NULL,
+        votes INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (comic_id, value)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS image_variants (
+        id SERIAL PRIMARY KEY,
+        page_id INTEGER REFERENCES pages (id) ON DELETE CASCADE,
+        comic_id INTEGER REFERENCES comics (id) ON DELETE CASCADE,
+        width INTEGER NOT NULL,
+        height INTEGER NOT NULL,
+        format VARCHAR(16) NOT NULL,
+        url VARCHAR(255) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_image_variants_page_id ON image_variants (page_id)",
+    "CREATE INDEX IF NOT EXISTS ix_image_variants_comic_id ON image_variants (comic_id)",
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
+    await add_column_if_missing(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+    # Старые комментарии остаются без даты: DEFAULT в ADD COLUMN проставил
+    # бы им время миграции, и trending счёл бы их новыми
+    await add_column_if_missing(conn, "comments", "created_at", "TIMESTAMP WITH TIME ZONE")
+    await conn.execute(text('ALTER TABLE comments ALTER COLUMN created_at SET DEFAULT now()'))
+    await add_column_if_missing(conn, "comic_stats", "comment_count", "INTEGER NOT NULL DEFAULT 0")
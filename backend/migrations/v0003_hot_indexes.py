@@ -0,0 +1,32 @@
+from sqlalchemy import text
+from migrations import create_index, drop_index
+
+# Индексы под горячие выборки по внешним ключам. На Postgres строятся
+# CONCURRENTLY, поэтому шаг выполняется вне транзакции.
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_pages_chapter_number", "pages", "chapter_id, number", None),
+    ("ix_chapters_volume_number", "chapters", "volume_id, number", None),
+    ("ix_volumes_comic_number", "volumes", "comic_id, number", None),
+    ("ix_comments_comic_created", "comments", '"comicID", created_at DESC, id DESC', None),
+    ("ix_ratings_comic_id", "ratings", "comic_id", None),
+    ("ix_comic_genres_genre_id", "comic_genres", "genre_id, comic_id", None),
+    ("ix_user_favorite_comics_comic_id", "user_favorite_comics", "comic_id", None),
+    ("ix_comics_date_of_out", "comics", "date_of_out DESC, id DESC", None),
+    ("ix_comics_user_id", "comics", '"userID"', None),
+    ("ix_comics_title_trgm", "comics", "title gin_trgm_ops", "gin"),
+    ("ix_comics_desc_trgm", "comics", '"desc" gin_trgm_ops', "gin"),
+]
+
+
+async def upgrade(conn):
+    # gin_trgm_ops для поиска по названию и описанию
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for name, table, columns, using in INDEXES:
+        await create_index(conn, name, table, columns, using)
+
+
+async def downgrade(conn):
+    for name, _, _, _ in reversed(INDEXES):
+        await drop_index(conn, name)
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+import author_stats
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS author_stats (
+        user_id INTEGER PRIMARY KEY REFERENCES users (id) ON DELETE CASCADE,
+        comic_count INTEGER NOT NULL DEFAULT 0,
+        first_published DATE,
+        last_published DATE,
+        ratings_received INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS ix_author_stats_debut
+    ON author_stats (last_published DESC, user_id DESC) WHERE comic_count = 1
+    """,
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
+    await author_stats.rebuild_author_stats(conn)
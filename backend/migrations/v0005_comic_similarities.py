@@ -0,0 +1,18 @@
+from sqlalchemy import text
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS comic_similarities (
+        comic_id INTEGER NOT NULL REFERENCES comics (id) ON DELETE CASCADE,
+        similar_id INTEGER NOT NULL REFERENCES comics (id) ON DELETE CASCADE,
+        score DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (comic_id, similar_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_comic_similarities_comic_score ON comic_similarities (comic_id, score DESC)",
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
@@ -0,0 +1,40 @@
+from sqlalchemy import text
+from migrations import add_column_if_missing, create_index, drop_index
+
+# Время событий для сортировки trending. У уже существующих оценок и
+# избранного created_at остаётся NULL: они в счёт не попадают.
+TRANSACTIONAL = False
+
+INDEXES = [
+    ("ix_ratings_created_at", "ratings", "created_at", None),
+    ("ix_user_favorite_comics_created_at", "user_favorite_comics", "created_at", None),
+    ("ix_comments_created_at", "comments", "created_at", None),
+    ("ix_comic_stats_trending", "comic_stats", "trending_score DESC, comic_id DESC", None),
+]
+
+TRENDING_STATE = """
+CREATE TABLE IF NOT EXISTS trending_state (
+    id SERIAL PRIMARY KEY,
+    epoch TIMESTAMP WITH TIME ZONE NOT NULL,
+    processed_until TIMESTAMP WITH TIME ZONE NOT NULL
+)
+"""
+
+
+async def upgrade(conn):
+    for table in ("ratings", "user_favorite_comics"):
+        # ADD COLUMN ... DEFAULT now() заполнил бы старые строки временем
+        # миграции; значение по умолчанию ставится отдельно, только для новых
+        await add_column_if_missing(conn, table, "created_at", "TIMESTAMP WITH TIME ZONE")
+        await conn.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN created_at SET DEFAULT now()'))
+    await add_column_if_missing(
+        conn, "comic_stats", "trending_score", "DOUBLE PRECISION NOT NULL DEFAULT 0"
+    )
+    await conn.execute(text(TRENDING_STATE))
+    for name, table, columns, using in INDEXES:
+        await create_index(conn, name, table, columns, using)
+
+
+async def downgrade(conn):
+    for name, _, _, _ in reversed(INDEXES):
+        await drop_index(conn, name)
@@ -0,0 +1,22 @@
+from sqlalchemy import text
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id SERIAL PRIMARY KEY,
+        kind VARCHAR(32) NOT NULL,
+        payload JSON NOT NULL,
+        status VARCHAR(16) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_jobs_pending ON jobs (run_after) WHERE status = 'pending'",
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
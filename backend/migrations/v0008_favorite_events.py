@@ -0,0 +1,30 @@
+from sqlalchemy import text
+from migrations import drop_index
+
+# Первое добавление в избранное для trending. Записи без created_at
+# (добавленные до v0006) в счёт не попадали и не переносятся. Индекс по
+# user_favorite_comics.created_at trending больше не читает.
+TRANSACTIONAL = False
+
+TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS favorite_events (
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        comic_id INTEGER NOT NULL REFERENCES comics (id) ON DELETE CASCADE,
+        created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, comic_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_favorite_events_created_at ON favorite_events (created_at)",
+    """
+    INSERT INTO favorite_events (user_id, comic_id, created_at)
+    SELECT user_id, comic_id, created_at FROM user_favorite_comics WHERE created_at IS NOT NULL
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+
+async def upgrade(conn):
+    for ddl in TABLES:
+        await conn.execute(text(ddl))
+    await drop_index(conn, "ix_user_favorite_comics_created_at")
@@ -0,0 +1,21 @@
+from sqlalchemy import text
+from migrations import create_index, drop_index
+
+# v0002 добавлял comments.created_at с DEFAULT в ADD COLUMN, и старые
+# комментарии получили время миграции — trending считал их новыми. Эта
+# отметка совпадает с applied_at записи v0002 (одна транзакция, один now()),
+# по ней даты и снимаются. Индекс страниц комментариев ставит строки без
+# даты в конец.
+TRANSACTIONAL = False
+
+
+async def upgrade(conn):
+    await conn.execute(text("ALTER TABLE comments ALTER COLUMN created_at DROP NOT NULL"))
+    await conn.execute(text(
+        "UPDATE comments SET created_at = NULL "
+        "WHERE created_at = (SELECT applied_at FROM schema_migrations WHERE version = 2)"
+    ))
+    await create_index(
+        conn, "ix_comments_comic_recent", "comments", '"comicID", created_at DESC NULLS LAST, id DESC'
+    )
+    await drop_index(conn, "ix_comments_comic_created")
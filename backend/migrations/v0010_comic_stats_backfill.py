@@ -0,0 +1,9 @@
+import comic_stats
+
+# Строки comic_stats для комиксов, созданных до этой таблицы. Раньше их
+# дозаполнял каждый запуск приложения; новые комиксы получают строку при
+# создании, полный пересчёт — python comic_stats.py
+
+
+async def upgrade(conn):
+    await comic_stats.rebuild_comic_stats(conn, only_missing=True)
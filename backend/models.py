@@ -1,4 +1,4 @@
-from sqlalchemy import Date, Column, ForeignKey, Integer, String, UniqueConstraint, Boolean, Table
+from sqlalchemy import Date, DateTime, Column, ForeignKey, Integer, String, Text, JSON, UniqueConstraint, Boolean, Table, Float, Index, func
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -6,7 +6,10 @@ user_favorite_comics = Table(
     "user_favorite_comics",
     Base.metadata,
     Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
-    Column("comic_id", Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    Column("comic_id", Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True),
+    # NULL у записей, добавленных до появления колонки
+    Column("created_at", DateTime(timezone=True), nullable=True, server_default=func.now()),
+    Index("ix_user_favorite_comics_comic_id", "comic_id"),
 )
 
 class ComicGenre(Base):
@@ -14,6 +17,10 @@ class ComicGenre(Base):
     comic_id = Column(Integer, ForeignKey("comics.id"), primary_key=True)
     genre_id = Column(Integer, ForeignKey("genres.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_comic_genres_genre_id", genre_id, comic_id),
+    )
+
 class Comic(Base):
     __tablename__ = "comics"
     id = Column(Integer, primary_key=True)
@@ -24,17 +31,141 @@ class Comic(Base):
     website_recommendation = Column(Boolean, nullable=False)
     img = Column(String(255), nullable=False)
     user = relationship("User", backref="comics")
-    genres = relationship("Genre", secondary="comic_genres", backref="comics", lazy='selectin')
-    volumes = relationship("Volume", back_populates="comic", cascade="all, delete-orphan", lazy="selectin")
+    genres = relationship("Genre", secondary="comic_genres", backref="comics")
+    volumes = relationship("Volume", back_populates="comic", cascade="all, delete-orphan")
     favorited_by_users = relationship(
         "User",
         secondary="user_favorite_comics",
-        back_populates="favorite_comics",
-        lazy="selectin"
+        back_populates="favorite_comics"
+    )
+    stats = relationship(
+        "ComicStats",
+        uselist=False,
+        back_populates="comic",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="joined"
     )
+    poster_variants = relationship(
+        "ImageVariant",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="ImageVariant.width"
+    )
+
+    @property
+    def average_rating(self):
+        if self.stats is None or self.stats.avg_rating is None:
+            return None
+        return round(self.stats.avg_rating, 2)
+
+    @property
+    def rating_count(self):
+        return self.stats.rating_count if self.stats is not None else 0
+
+    @property
+    def comment_count(self):
+        return self.stats.comment_count if self.stats is not None else 0
+
+    __table_args__ = (
+        Index("ix_comics_date_of_out", date_of_out.desc(), id.desc()),
+        Index("ix_comics_user_id", userID),
+        Index(
+            "ix_comics_title_trgm", "title",
+            postgresql_using="gin", postgresql_ops={"title": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_comics_desc_trgm", "desc",
+            postgresql_using="gin", postgresql_ops={"desc": "gin_trgm_ops"},
+        ),
+    )
+
     def __str__(self):
         return self.title
 
+# Денормализованные агрегаты по комиксу, обновляются в одной транзакции с оценками
+class ComicStats(Base):
+    __tablename__ = "comic_stats"
+    comic_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    avg_rating = Column(Float, nullable=True)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Сумма весов событий * 2 ** ((время события - trending_state.epoch) / период
+    # полураспада): порядок по ней совпадает с порядком по затухающему счёту
+    trending_score = Column(Float, nullable=False, default=0, server_default="0")
+
+    comic = relationship("Comic", back_populates="stats")
+
+    __table_args__ = (
+        Index("ix_comic_stats_avg_rating", avg_rating.desc().nullslast(), comic_id.desc()),
+        Index(
+            "ix_comic_stats_popular",
+            rating_count.desc(),
+            avg_rating.desc().nullslast(),
+            comic_id.desc(),
+        ),
+        Index("ix_comic_stats_trending", trending_score.desc(), comic_id.desc()),
+    )
+
+# Первое добавление комикса в избранное: строка не удаляется при снятии,
+# поэтому повторное добавление не даёт trending нового события
+class FavoriteEvent(Base):
+    __tablename__ = "favorite_events"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    comic_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_favorite_events_created_at", created_at),
+    )
+
+# Точка отсчёта trending_score и момент, до которого события уже учтены
+class TrendingState(Base):
+    __tablename__ = "trending_state"
+    id = Column(Integer, primary_key=True)
+    epoch = Column(DateTime(timezone=True), nullable=False)
+    processed_until = Column(DateTime(timezone=True), nullable=False)
+
+# Счётчики по автору: поддерживаются при создании и удалении комиксов и при
+# новых оценках; author_stats.py check/rebuild сверяет их с comics и ratings
+class AuthorStats(Base):
+    __tablename__ = "author_stats"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    comic_count = Column(Integer, nullable=False, default=0, server_default="0")
+    first_published = Column(Date, nullable=True)
+    last_published = Column(Date, nullable=True)
+    ratings_received = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Новые авторы с единственным комиксом — диапазон по частичному индексу
+        Index(
+            "ix_author_stats_debut",
+            last_published.desc(),
+            user_id.desc(),
+            postgresql_where=comic_count == 1,
+            sqlite_where=comic_count == 1,
+        ),
+    )
+
+# Top-K похожих комиксов (item-item по оценкам и избранному), строит recommend.py
+class ComicSimilarity(Base):
+    __tablename__ = "comic_similarities"
+    comic_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    similar_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index("ix_comic_similarities_comic_score", comic_id, score.desc()),
+    )
+
+# Гистограмма оценок 0–10: сколько раз комикс получил каждую оценку
+class ComicRatingBucket(Base):
+    __tablename__ = "comic_rating_histogram"
+    comic_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), primary_key=True)
+    value = Column(Integer, primary_key=True)
+    votes = Column(Integer, nullable=False, default=0, server_default="0")
+
 class Volume(Base):
     __tablename__ = "volumes"
     id = Column(Integer, primary_key=True)
@@ -42,7 +173,11 @@ class Volume(Base):
     comic_id = Column(Integer, ForeignKey("comics.id"), nullable=False)
 
     comic = relationship("Comic", back_populates="volumes")
-    chapters = relationship("Chapter", back_populates="volume", cascade="all, delete-orphan", lazy="selectin")
+    chapters = relationship("Chapter", back_populates="volume", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_volumes_comic_number", comic_id, number),
+    )
     
 class Chapter(Base):
     __tablename__ = "chapters"
@@ -52,7 +187,11 @@ class Chapter(Base):
     volume_id = Column(Integer, ForeignKey("volumes.id"), nullable=False)
 
     volume = relationship("Volume", back_populates="chapters")
-    pages = relationship("Page", back_populates="chapter", cascade="all, delete-orphan", lazy="selectin")
+    pages = relationship("Page", back_populates="chapter", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_chapters_volume_number", volume_id, number),
+    )
     
 class Page(Base):
     __tablename__ = "pages"
@@ -62,6 +201,51 @@ class Page(Base):
     chapter_id = Column(Integer, ForeignKey("chapters.id"), nullable=False)
 
     chapter = relationship("Chapter", back_populates="pages")
+    variants = relationship(
+        "ImageVariant",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="ImageVariant.width"
+    )
+
+    __table_args__ = (
+        Index("ix_pages_chapter_number", chapter_id, number),
+    )
+
+# Уменьшенные копии страницы (page_id) или постера (comic_id) в webp/avif
+class ImageVariant(Base):
+    __tablename__ = "image_variants"
+    id = Column(Integer, primary_key=True)
+    page_id = Column(Integer, ForeignKey("pages.id", ondelete="CASCADE"), nullable=True, index=True)
+    comic_id = Column(Integer, ForeignKey("comics.id", ondelete="CASCADE"), nullable=True, index=True)
+    width = Column(Integer, nullable=False)
+    height = Column(Integer, nullable=False)
+    format = Column(String(16), nullable=False)
+    url = Column(String(255), nullable=False)
+
+# Очередь файловых задач (jobs.py). Строка добавляется в той же транзакции,
+# что и изменение в базе, и удаляется после успешного выполнения.
+class Job(Base):
+    __tablename__ = "jobs"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(32), nullable=False)
+    payload = Column(JSON, nullable=False)
+    # pending — ждёт выполнения, failed — попытки исчерпаны
+    status = Column(String(16), nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    # Не раньше этого времени; у взятой задачи — конец аренды воркера
+    run_after = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    __table_args__ = (
+        Index(
+            "ix_jobs_pending",
+            run_after,
+            postgresql_where=status == "pending",
+            sqlite_where=status == "pending",
+        ),
+    )
 
 class Genre(Base):
     __tablename__ = "genres"
@@ -78,14 +262,15 @@ class User(Base):
     nick = Column(String(255), unique=True, nullable=False)
     password = Column(String(255), nullable=False) 
     roleId = Column(Integer, ForeignKey('roles.id'), nullable=False)
+    # Увеличивается при отзыве всех токенов пользователя
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")
 
     role = relationship("Role", backref="users")
 
     favorite_comics = relationship(
         "Comic",
         secondary="user_favorite_comics",
-        back_populates="favorited_by_users",
-        lazy="selectin"
+        back_populates="favorited_by_users"
     )
     
     def __str__(self):
@@ -97,9 +282,18 @@ class Comment(Base):
     userID = Column(Integer, ForeignKey('users.id'), nullable=False)
     comment = Column(String(255), nullable=False) 
     comicID = Column(Integer, ForeignKey('comics.id'), nullable=False)
+    # NULL у комментариев, написанных до появления колонки
+    created_at = Column(DateTime(timezone=True), nullable=True, server_default=func.now())
 
     user = relationship("User", backref="comments")
     comic = relationship("Comic", backref="comments")
+
+    __table_args__ = (
+        # Первая страница комментариев — диапазон по индексу, новые сверху,
+        # комментарии без даты — в конце
+        Index("ix_comments_comic_recent", comicID, created_at.desc().nullslast(), id.desc()),
+        Index("ix_comments_created_at", created_at),
+    )
     
     def __str__(self):
         return self.comment
@@ -118,12 +312,17 @@ class Rating(Base):
     user_id = Column(Integer, ForeignKey('users.id'), nullable=False)  # Убрал unique=True
     comic_id = Column(Integer, ForeignKey('comics.id'), nullable=False)
     value = Column(Integer, nullable=False)
+    # NULL у оценок, поставленных до появления колонки
+    created_at = Column(DateTime(timezone=True), nullable=True, server_default=func.now())
 
     user = relationship("User", backref="ratings")
     comic = relationship("Comic", backref="ratings")
 
     __table_args__ = (
         UniqueConstraint('user_id', 'comic_id', name='_user_comic_uc'),
+        # _user_comic_uc начинается с user_id и выборки по комиксу не покрывает
+        Index("ix_ratings_comic_id", comic_id),
+        Index("ix_ratings_created_at", created_at),
     )
     
     def __str__(self):
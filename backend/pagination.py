@@ -0,0 +1,19 @@
+import base64
+import json
+from fastapi import HTTPException
+
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise HTTPException(status_code=400, detail="Некорректный курсор") from e
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    return data
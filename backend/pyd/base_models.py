@@ -12,6 +12,19 @@ class UserBase(BaseModel):
     email: str = Field(..., example="user@example.com", max_length=255)
     nick: str = Field(..., example="cool_user", max_length=255)
 
+class AuthorPage(BaseModel):
+    items: List[UserBase] = []
+    next_cursor: Optional[str] = None
+
+class ImageVariantResponse(BaseModel):
+    width: int = Field(..., example=480)
+    height: int = Field(..., example=720)
+    format: str = Field(..., example="webp")
+    url: str = Field(..., example="comics/Комикс 1/comic/vl1/ch1/_v/1.480.webp")
+
+    class Config:
+        from_attributes = True
+
 class ComicBase(BaseModel):
     id: int
     title: str = Field(..., example="Shrek", max_length=255)
@@ -19,24 +32,47 @@ class ComicBase(BaseModel):
     date_of_out: date = Field(..., example="2023-01-15")
     website_recommendation: bool = Field(..., example=True)
     img: str =Field(...)
+    poster_variants: List[ImageVariantResponse] = []
     average_rating: Optional[float] = None
+    rating_count: int = 0
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
 
+class ComicPage(BaseModel):
+    items: List[ComicBase] = []
+    next_cursor: Optional[str] = Field(None, example="eyJzIjoiYXNjIiwiayI6WyJTaHJlayJdLCJpZCI6MX0")
+
 class CommentBase(BaseModel):
     userID: int
     comicID: int
     user: UserBase
     comment: str = Field(..., example="Great comic!", max_length=255)
 
+class CommentItem(CommentBase):
+    id: int = Field(..., example=1)
+    created_at: Optional[datetime] = Field(None, example="2023-01-15T12:00:00")
+
+    class Config:
+        from_attributes = True
+
+class CommentPage(BaseModel):
+    items: List[CommentItem] = []
+    next_cursor: Optional[str] = None
+
 class RatingBase(BaseModel):
     value: int = Field(..., ge=0, le=10, example=8)
 
+class RatingResult(RatingBase):
+    average_rating: Optional[float] = Field(None, example=8.25)
+    rating_count: int = Field(0, example=4)
+
 class PageResponse(BaseModel):
     id: int
     number: int = Field(..., example=1)
     image_url: str = Field(..., example="comics/Комикс 1/comic/vl1/ch1/1.jpg")
+    variants: List[ImageVariantResponse] = []
 
     class Config:
         from_attributes = True
@@ -50,6 +86,18 @@ class ChapterResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ReaderChapterResponse(BaseModel):
+    id: int
+    number: int = Field(..., example=2)
+    title: Optional[str] = Field(None, example="Начало")
+    volume_number: int = Field(..., example=1)
+    comic_id: int = Field(..., example=1)
+    prev_chapter_id: Optional[int] = Field(None, example=1)
+    next_chapter_id: Optional[int] = Field(None, example=3)
+    pages: List[PageResponse] = []
+    # Первые страницы следующей главы для предзагрузки
+    next_pages: List[PageResponse] = []
+
 class VolumeResponse(BaseModel):
     id: int
     number: int = Field(..., example=1)
@@ -80,6 +128,7 @@ class ComicResponse(ComicBase):
     id: int = Field(..., example=1)
     userID: int = Field(..., example=1)
     average_rating: Optional[float] = Field(None, example=4.5)
+    rating_histogram: List[int] = Field(default=[], example=[0, 0, 0, 0, 0, 1, 0, 2, 5, 3, 1])
     user: UserResponse
     genres: List[GenreResponse] = []
     volumes: List[VolumeResponse] = []
@@ -89,7 +138,7 @@ class ComicResponse(ComicBase):
 
 class CommentResponse(CommentBase):
     id: int = Field(..., example=1)
-    created_at: datetime = Field(..., example="2023-01-15T12:00:00")
+    created_at: Optional[datetime] = Field(None, example="2023-01-15T12:00:00")
     user: UserResponse
     comic: ComicBase
     class Config:
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import numpy as np
+from scipy import sparse
+from sqlalchemy import text, delete, insert
+from database import AsyncSessionLocal
+from config import settings
+import models as m
+
+# Похожие комиксы по взаимодействиям пользователей (item-item cosine):
+#   python recommend.py
+# Оценка 0–10 даёт вес (value - 5) / 5, избранное — 1.0, веса одной пары
+# складываются. Результат целиком заменяет comic_similarities в одной
+# транзакции, читатели до коммита видят прошлую версию.
+
+INTERACTIONS = (
+    "SELECT user_id, comic_id, CAST((value - 5) / 5.0 AS double precision) FROM ratings",
+    "SELECT user_id, comic_id, CAST(1.0 AS double precision) FROM user_favorite_comics",
+)
+FETCH_SIZE = 100_000
+
+
+async def load_matrix(db) -> sparse.csr_matrix:
+    # Разреженная матрица пользователь × комикс; id используются как индексы
+    parts = []
+    for query in INTERACTIONS:
+        result = await db.stream(text(query).execution_options(yield_per=FETCH_SIZE))
+        async for rows in result.partitions(FETCH_SIZE):
+            parts.append(np.asarray(rows, dtype=np.float64))
+    if not parts:
+        return sparse.csr_matrix((0, 0))
+    data = np.concatenate(parts)
+    users = data[:, 0].astype(np.int64)
+    comics = data[:, 1].astype(np.int64)
+    matrix = sparse.coo_matrix(
+        (data[:, 2], (users, comics)),
+        shape=(users.max() + 1, comics.max() + 1),
+    ).tocsr()
+    matrix.sum_duplicates()
+    np.clip(matrix.data, -1.0, 2.0, out=matrix.data)
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def top_similar(matrix: sparse.csr_matrix, top_k: int, min_score: float, block_size: int):
+    # Косинусная близость столбцов блоками: на блок из block_size комиксов
+    # нужна плотная матрица n_comics × block_size, а не n_comics × n_comics.
+    # Выдаёт массивы (comic_id, similar_id, score) по блокам.
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1.0
+    normalized = (matrix @ sparse.diags(1.0 / norms)).astype(np.float32).tocsc()
+    transposed = normalized.T.tocsr()
+    active = np.flatnonzero(np.diff(normalized.indptr))
+    n_comics = normalized.shape[1]
+    k = min(top_k, n_comics - 1)
+    if k <= 0:
+        return
+
+    for start in range(0, len(active), block_size):
+        columns = active[start:start + block_size]
+        scores = (transposed @ normalized[:, columns]).toarray()
+        scores[columns, np.arange(len(columns))] = -np.inf
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        top_scores = np.take_along_axis(scores, top, axis=0)
+        order = np.argsort(-top_scores, axis=0)
+        top = np.take_along_axis(top, order, axis=0)
+        top_scores = np.take_along_axis(top_scores, order, axis=0)
+
+        keep = top_scores >= min_score
+        comic_ids = np.broadcast_to(columns, top.shape)[keep]
+        yield comic_ids, top[keep], top_scores[keep]
+
+
+async def store(db, blocks) -> int:
+    await db.execute(delete(m.ComicSimilarity))
+    conn = await db.connection()
+    driver = None
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+    total = 0
+    for comic_ids, similar_ids, scores in blocks:
+        records = list(zip(comic_ids.tolist(), similar_ids.tolist(), scores.tolist()))
+        if not records:
+            continue
+        if driver is not None:
+            await driver.copy_records_to_table(
+                "comic_similarities", records=records, columns=["comic_id", "similar_id", "score"]
+            )
+        else:
+            await db.execute(
+                insert(m.ComicSimilarity),
+                [{"comic_id": c, "similar_id": s, "score": v} for c, s, v in records],
+            )
+        total += len(records)
+    return total
+
+
+async def build():
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        matrix = await load_matrix(session)
+        print(f"Матрица {matrix.shape[0]}×{matrix.shape[1]}, {matrix.nnz} взаимодействий "
+              f"за {time.perf_counter() - started:.1f} с")
+        blocks = top_similar(
+            matrix,
+            settings.RECOMMEND_TOP_K,
+            settings.RECOMMEND_MIN_SCORE,
+            settings.RECOMMEND_BLOCK_SIZE,
+        )
+        total = await store(session, blocks)
+        await session.commit()
+    print(f"Сохранено {total} пар за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    asyncio.run(build())
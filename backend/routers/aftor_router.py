@@ -1,54 +1,54 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
-from sqlalchemy.orm import selectinload
-from database import get_db
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import load_only
+from database import get_read_db
 import models as m
 import pyd
-from typing import List
+from typing import List, Optional, Union
+from pagination import encode_cursor, decode_cursor
 
 router = APIRouter(
     prefix="/aftor",
     tags=["aftor"],
 )
 
-@router.get("/new_authors", response_model=List[pyd.UserBase])
-async def get_new_authors(db: AsyncSession = Depends(get_db)):
-    subquery = (
-        select(
-            m.Comic.userID,
-            func.count(m.Comic.id).label("comics_count")
-        )
-        .group_by(m.Comic.userID)
-        .subquery())
-    last_comic_date = (
-        select(
-            m.Comic.userID,
-            func.max(m.Comic.date_of_out).label("last_date")
-        )
-        .group_by(m.Comic.userID)
-        .subquery())
-    result = await db.execute(
-        select(m.User)
-        .join(
-            subquery,
-            m.User.id == subquery.c.userID
-        )
-        .join(
-            last_comic_date,
-            m.User.id == last_comic_date.c.userID
-        )
-        .where(
-            and_(
-                m.User.roleId.in_([1, 3]),
-                subquery.c.comics_count == 1
-            )
-        )
-        .order_by(
-            last_comic_date.c.last_date.desc()
-        )
+@router.get("/new_authors", response_model=Union[List[pyd.UserBase], pyd.AuthorPage])
+async def get_new_authors(
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Пустая строка — первая страница в режиме курсора"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Авторы с единственным комиксом, новые сверху: диапазон по частичному
+    # индексу ix_author_stats_debut вместо GROUP BY по всей таблице comics
+    stmt = (
+        select(m.User, m.AuthorStats.last_published)
+        .join(m.AuthorStats, m.AuthorStats.user_id == m.User.id)
+        .where(m.AuthorStats.comic_count == 1, m.User.roleId.in_([1, 3]))
+        .order_by(m.AuthorStats.last_published.desc(), m.AuthorStats.user_id.desc())
+        .options(load_only(m.User.id, m.User.email, m.User.nick))
+        .limit(limit + 1)
     )
-    
-    authors = result.scalars().all()
-    return authors
\ No newline at end of file
+    if cursor:
+        data = decode_cursor(cursor)
+        try:
+            last_published, user_id = date.fromisoformat(data["d"]), int(data["id"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail="Некорректный курсор") from e
+        stmt = stmt.where(
+            tuple_(m.AuthorStats.last_published, m.AuthorStats.user_id) < tuple_(last_published, user_id)
+        )
+    result = await db.execute(stmt)
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        user, last_published = rows[limit - 1]
+        next_cursor = encode_cursor({"d": last_published.isoformat(), "id": user.id})
+        rows = rows[:limit]
+    authors = [row[0] for row in rows]
+
+    if cursor is None:
+        return authors
+    return {"items": authors, "next_cursor": next_cursor}
@@ -1,18 +1,27 @@
+from dataclasses import asdict
 from datetime import date
 import os
-import shutil
-from fastapi import FastAPI, File, Form, HTTPException, Depends, APIRouter, UploadFile, Query
+import zipfile
+from fastapi import FastAPI, File, Form, HTTPException, Depends, APIRouter, UploadFile, Query, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import label, select, desc, func, asc, nullslast, delete
+from sqlalchemy import label, select, desc, func, asc, nullslast, delete, insert
 from sqlalchemy.orm import selectinload, noload
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 import models as m
 from typing import List, Optional
 import pyd
 from sqlalchemy.sql.functions import coalesce
-from auth import get_current_user
+from auth import get_current_user, CurrentUser
+from config import settings
+from cache import response_cache
+import storage
+import images
+import comic_detail
+import author_stats
+import jobs
+import importer
 
 router = APIRouter(
     prefix="/create",
@@ -24,11 +33,12 @@ COMICS_ROOT = os.path.join(FILES_ROOT, "comics")
 
 @router.post("/comics/")
 async def create_comic(
+    background_tasks: BackgroundTasks,
     title: str = Form(...),
     desc: str = Form(None),
     poster: UploadFile = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
 
     existing = await db.execute(select(m.Comic).where(m.Comic.title == title))
@@ -40,13 +50,11 @@ async def create_comic(
     comic_root = os.path.join(COMICS_ROOT, safe_folder_name)
     poster_folder = os.path.join(comic_root, "poster")
     comic_folder = os.path.join(comic_root, "comic")
-    os.makedirs(poster_folder, exist_ok=True)
-    os.makedirs(comic_folder, exist_ok=True)
+    await storage.makedirs(poster_folder)
 
     poster_filename = f"{safe_folder_name}_poster.jpg"
     poster_path = os.path.join(poster_folder, poster_filename)
-    with open(poster_path, "wb") as f:
-        shutil.copyfileobj(poster.file, f)
+    poster_path = await storage.save_upload(poster, poster_path)
 
     relative_poster_path = os.path.relpath(poster_path, FILES_ROOT).replace("\\", "/")
 
@@ -57,10 +65,16 @@ async def create_comic(
         website_recommendation=False,
         img=relative_poster_path,
         userID=current_user.id,
+        stats=m.ComicStats(),
     )
     db.add(new_comic)
+    await author_stats.comic_added(db, current_user.id, new_comic.date_of_out)
+    jobs.enqueue(db, "makedirs", paths=[comic_folder])
     await db.commit()
+    jobs.wake()
     await db.refresh(new_comic)
+    response_cache.invalidate_tags("comics")
+    background_tasks.add_task(images.create_poster_variants, new_comic.id)
 
     return {"id": new_comic.id, "title": new_comic.title}
 
@@ -68,23 +82,27 @@ async def create_comic(
 async def create_volume(
     comic_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    result = await db.execute(select(m.Comic).where(m.Comic.id == comic_id))
+    # FOR NO KEY UPDATE, как у импорта архива: номера томов выдаются по очереди
+    result = await db.execute(select(m.Comic).where(m.Comic.id == comic_id).with_for_update(key_share=True))
     comic = result.scalar_one_or_none()
     if not comic:
         raise HTTPException(status_code=404, detail="Комикс не найден")
 
-    next_number = len(comic.volumes) + 1
+    last_number = await db.scalar(
+        select(func.max(m.Volume.number)).where(m.Volume.comic_id == comic_id)
+    )
+    next_number = (last_number or 0) + 1
 
     volume = m.Volume(number=next_number, comic_id=comic_id)
     db.add(volume)
+    comic_folder = os.path.join(COMICS_ROOT, comic.title.replace(" ", "_"), "comic")
+    jobs.enqueue(db, "makedirs", paths=[os.path.join(comic_folder, f"vl{next_number}")])
     await db.commit()
+    jobs.wake()
     await db.refresh(volume)
-
-    comic_folder = os.path.join(COMICS_ROOT, comic.title.replace(" ", "_"), "comic")
-    volume_folder = os.path.join(comic_folder, f"vl{volume.number}")
-    os.makedirs(volume_folder, exist_ok=True)
+    comic_detail.invalidate(comic_id)
 
     return {"id": volume.id, "number": volume.number}
 
@@ -93,25 +111,29 @@ async def create_chapter(
     volume_id: int,
     title: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     result = await db.execute(select(m.Volume).options(selectinload(m.Volume.comic)).where(m.Volume.id == volume_id))
     volume = result.scalar_one_or_none()
     if not volume:
         raise HTTPException(status_code=404, detail="Том не найден")
 
-    next_number = len(volume.chapters) + 1
+    last_number = await db.scalar(
+        select(func.max(m.Chapter.number)).where(m.Chapter.volume_id == volume_id)
+    )
+    next_number = (last_number or 0) + 1
 
     chapter = m.Chapter(number=next_number, title=title, volume_id=volume_id)
     db.add(chapter)
-    await db.commit()
-    await db.refresh(chapter)
-
     comic_title_safe = volume.comic.title.replace(" ", "_")
     chapter_folder = os.path.join(
-        COMICS_ROOT, comic_title_safe, "comic", f"vl{volume.number}", f"ch{chapter.number}"
+        COMICS_ROOT, comic_title_safe, "comic", f"vl{volume.number}", f"ch{next_number}"
     )
-    os.makedirs(chapter_folder, exist_ok=True)
+    jobs.enqueue(db, "makedirs", paths=[chapter_folder])
+    await db.commit()
+    jobs.wake()
+    await db.refresh(chapter)
+    comic_detail.invalidate(volume.comic_id)
 
     return {"id": chapter.id, "number": chapter.number, "title": chapter.title}
 
@@ -119,11 +141,11 @@ async def create_chapter(
 async def delete_volume(
     volume_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     result = await db.execute(select(m.Volume).where(m.Volume.id == volume_id).options(
         selectinload(m.Volume.comic),
-        selectinload(m.Volume.chapters),
+        selectinload(m.Volume.chapters).selectinload(m.Chapter.pages),
     ))
     volume = result.scalar_one_or_none()
     if not volume:
@@ -136,11 +158,14 @@ async def delete_volume(
         "comic",
         f"vl{volume.number}",
     )
-    if os.path.exists(volume_folder):
-        shutil.rmtree(volume_folder)
+    trash = jobs.trash_path(volume_folder)
 
     await db.delete(volume)
+    jobs.enqueue(db, "rmtree", path=trash)
     await db.commit()
+    await storage.rename_if_exists(volume_folder, trash)
+    jobs.wake()
+    comic_detail.invalidate(volume.comic_id)
 
     return {"detail": "Том удалён"}
 
@@ -149,7 +174,7 @@ async def delete_volume(
 async def delete_chapter(
     chapter_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     result = await db.execute(select(m.Chapter).where(m.Chapter.id == chapter_id).options(
         selectinload(m.Chapter.pages),
@@ -167,11 +192,14 @@ async def delete_chapter(
         f"vl{chapter.volume.number}",
         f"ch{chapter.number}",
     )
-    if os.path.exists(chapter_folder):
-        shutil.rmtree(chapter_folder)
+    trash = jobs.trash_path(chapter_folder)
 
     await db.delete(chapter)
+    jobs.enqueue(db, "rmtree", path=trash)
     await db.commit()
+    await storage.rename_if_exists(chapter_folder, trash)
+    jobs.wake()
+    comic_detail.invalidate(chapter.volume.comic_id)
 
     return {"detail": "Глава удалена"}
 
@@ -180,9 +208,10 @@ async def delete_chapter(
 @router.post("/chapters/{chapter_id}/pages")
 async def upload_pages_to_chapter(
     chapter_id: int,
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     result = await db.execute(
         select(m.Chapter)
@@ -201,63 +230,98 @@ async def upload_pages_to_chapter(
         f"vl{chapter.volume.number}",
         f"ch{chapter.number}",
     )
-    os.makedirs(chapter_folder, exist_ok=True)
+    await storage.makedirs(chapter_folder)
 
     result = await db.execute(
         select(func.max(m.Page.number)).where(m.Page.chapter_id == chapter.id)
     )
     max_page_number = result.scalar() or 0
 
-    created_pages = []
+    budget = storage.UploadBudget(settings.UPLOAD_MAX_REQUEST_BYTES)
+    saved_paths = []
+    rows = []
+    try:
+        for i, file in enumerate(files, start=1):
+            page_number = max_page_number + i
 
-    for i, file in enumerate(files, start=1):
-        page_number = max_page_number + i
+            extension = os.path.splitext(file.filename)[1]
+            filename = f"{page_number}{extension}"
+            filepath = os.path.join(chapter_folder, filename)
 
-        extension = os.path.splitext(file.filename)[1]
-        filename = f"{page_number}{extension}"
-        filepath = os.path.join(chapter_folder, filename)
+            filepath = await storage.save_upload(file, filepath, budget)
+            saved_paths.append(filepath)
 
-        with open(filepath, "wb") as f:
-            content = await file.read()
-            f.write(content)
+            relative_path = os.path.relpath(filepath, FILES_ROOT).replace("\\", "/")
+            rows.append({"number": page_number, "image_url": relative_path, "chapter_id": chapter.id})
 
-        relative_path = os.path.relpath(filepath, FILES_ROOT).replace("\\", "/")
-        page = m.Page(
-            number=page_number,
-            image_url=relative_path,
-            chapter_id=chapter.id
-        )
-        db.add(page)
-        created_pages.append(page_number)
+        result = await db.execute(insert(m.Page).returning(m.Page.id, m.Page.number), rows)
+        inserted = result.all()
+        await db.commit()
+    except BaseException:
+        await storage.remove_files(saved_paths)
+        raise
 
-    await db.commit()
+    created_pages = sorted(number for _, number in inserted)
+    background_tasks.add_task(images.create_page_variants, [page_id for page_id, _ in inserted])
 
     return {"detail": f"{len(created_pages)} страниц добавлено", "pages": created_pages}
 
 
+@router.post("/comics/{comic_id}/import")
+async def import_archive(
+    comic_id: int,
+    background_tasks: BackgroundTasks,
+    archive: UploadFile = File(...),
+    import_id: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    # CBZ/ZIP с томами и главами за один запрос. Ход импорта с переданным
+    # import_id отдаёт GET /create/imports/{import_id}
+    progress = importer.ImportProgress()
+    if import_id:
+        importer.progress_cache.set(import_id, progress)
+    try:
+        zip_file = zipfile.ZipFile(archive.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Файл не является ZIP/CBZ-архивом")
+    with zip_file:
+        summary = await importer.import_pages(db, comic_id, importer.zip_entries(zip_file), progress)
+    background_tasks.add_task(importer.create_variants, summary.pop("page_ids"))
+
+    return summary
+
+
+@router.get("/imports/{import_id}")
+async def import_status(
+    import_id: str,
+    current_user: CurrentUser = Depends(get_current_user),
+):
+    progress = importer.progress_cache.get(import_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Импорт не найден")
+    return asdict(progress)
+
+
 @router.delete("/pages/{page_id}")
 async def delete_page(
     page_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
-    result = await db.execute(select(m.Page).where(m.Page.id == page_id).options(selectinload(m.Page.chapter)))
+    result = await db.execute(select(m.Page).where(m.Page.id == page_id).options(
+        selectinload(m.Page.chapter),
+        selectinload(m.Page.variants),
+    ))
     page = result.scalar_one_or_none()
     if not page:
         raise HTTPException(status_code=404, detail="Страница не найдена")
 
-    # Удаляем файл
-    file_path = os.path.join(FILES_ROOT, page.image_url)
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
+    # Файл, его варианты и опустевшие папки удаляет задача после коммита
+    paths = [os.path.join(FILES_ROOT, url) for url in [page.image_url, *(v.url for v in page.variants)]]
     await db.delete(page)
+    jobs.enqueue(db, "remove_files", paths=paths, prune=True)
     await db.commit()
-
-    folder_path = os.path.dirname(file_path)
-    try:
-        os.rmdir(folder_path)  
-    except OSError:
-        pass  
+    jobs.wake()
 
     return {"detail": "Страница удалена"}
@@ -1,15 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends, APIRouter, UploadFile, Query
+from urllib.parse import quote
+from fastapi import FastAPI, HTTPException, Depends, APIRouter, UploadFile, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from database import get_db
+from database import get_db, get_read_db, from_primary
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import label, select, desc, func, asc, nullslast, delete
+from sqlalchemy import label, select, desc, func, asc, nullslast, delete, and_, or_, tuple_, union_all
 from sqlalchemy.orm import selectinload, noload
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 import models as m
-from typing import List, Optional
+from typing import List, Optional, Union
 import pyd
 from sqlalchemy.sql.functions import coalesce
-from auth import get_current_user
+from auth import get_current_user, get_optional_user, CurrentUser
+import comic_detail
+import load_profiles
+from cache import response_cache
+from config import settings
+import search
+from pagination import encode_cursor, decode_cursor
 
 router = APIRouter(
     prefix="/comic",
@@ -17,138 +24,298 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[pyd.ComicBase])
-async def get_all_comics(db: AsyncSession = Depends(get_db)):
-    comics = await db.execute(select(m.Comic)) 
+async def get_all_comics(db: AsyncSession = Depends(get_read_db)):
+    comics = await db.execute(select(m.Comic).options(*load_profiles.CARD)) 
     comics_list = comics.scalars().all()
     return comics_list
 
 
-@router.get("/comics", response_model=List[pyd.ComicBase])
+def _cards(comics) -> List[pyd.ComicBase]:
+    return [pyd.ComicBase.model_validate(comic) for comic in comics]
+
+def _avg_rating_after(avg_rating: Optional[float], comic_id: int):
+    # Порядок: avg_rating DESC NULLS LAST, comic_id DESC
+    if avg_rating is None:
+        return and_(m.ComicStats.avg_rating.is_(None), m.ComicStats.comic_id < comic_id)
+    return or_(
+        m.ComicStats.avg_rating < avg_rating,
+        and_(m.ComicStats.avg_rating == avg_rating, m.ComicStats.comic_id < comic_id),
+        m.ComicStats.avg_rating.is_(None),
+    )
+
+def _comics_after(sort: str, cursor: str):
+    data = decode_cursor(cursor)
+    key, comic_id = data.get("k"), data.get("id")
+    if data.get("s") != sort or not isinstance(key, list) or not isinstance(comic_id, int):
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+    try:
+        if sort == "asc":
+            (title,) = key
+            return or_(m.Comic.title > title, and_(m.Comic.title == title, m.Comic.id > comic_id))
+        if sort == "trending":
+            (score,) = key
+            return or_(
+                m.ComicStats.trending_score < score,
+                and_(m.ComicStats.trending_score == score, m.ComicStats.comic_id < comic_id),
+            )
+        if sort == "popular":
+            rating_count, avg_rating = key
+            return or_(
+                m.ComicStats.rating_count < rating_count,
+                and_(
+                    m.ComicStats.rating_count == rating_count,
+                    _avg_rating_after(avg_rating, comic_id),
+                ),
+            )
+        (avg_rating,) = key
+        return _avg_rating_after(avg_rating, comic_id)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail="Некорректный курсор") from e
+
+def _comic_cursor(sort: str, comic: m.Comic) -> str:
+    if sort == "asc":
+        key = [comic.title]
+    elif sort == "popular":
+        key = [comic.stats.rating_count, comic.stats.avg_rating]
+    elif sort == "trending":
+        key = [comic.stats.trending_score]
+    else:
+        key = [comic.stats.avg_rating]
+    return encode_cursor({"s": sort, "k": key, "id": comic.id})
+
+@router.get("/comics", response_model=Union[List[pyd.ComicBase], pyd.ComicPage])
 async def get_comics(
     genres: List[int] = Query(default=[]),
     min_rating: Optional[float] = Query(default=None, ge=0.0, le=10.0),
-    sort: Optional[str] = Query(default="avg_rating", enum=["asc", "avg_rating", "popular"]),
+    sort: Optional[str] = Query(default="avg_rating", enum=["asc", "avg_rating", "popular", "trending"]),
     page: int = Query(default=1, ge=1),
     limit: int = Query(default=10, ge=1, le=30),  
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(default=None, description="Пустая строка — первая страница в режиме курсора"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    avg_rating = func.avg(m.Rating.value).label("avg_rating")
-    rating_count = func.count(m.Rating.id).label("rating_count")
-
-    stmt = select(m.Comic, avg_rating, rating_count).outerjoin(m.Rating)
+    stmt = (
+        select(m.Comic)
+        .join(m.Comic.stats)
+        .options(*load_profiles.CARD_JOINED_STATS)
+    )
     if genres:
-        stmt = stmt.join(m.Comic.genres).where(m.Genre.id.in_(genres))
-    stmt = stmt.group_by(m.Comic.id)
+        stmt = stmt.where(
+            m.Comic.id.in_(
+                select(m.ComicGenre.comic_id).where(m.ComicGenre.genre_id.in_(genres))
+            )
+        )
     if min_rating is not None:
-        stmt = stmt.having(avg_rating >= min_rating)
+        stmt = stmt.where(m.ComicStats.avg_rating >= min_rating)
     if sort == "asc":
-        stmt = stmt.order_by(asc(m.Comic.title))
+        stmt = stmt.order_by(asc(m.Comic.title), asc(m.Comic.id))
     elif sort == "popular":
-        stmt = stmt.order_by(desc(rating_count), nullslast(desc(avg_rating)))
+        stmt = stmt.order_by(
+            desc(m.ComicStats.rating_count),
+            nullslast(desc(m.ComicStats.avg_rating)),
+            desc(m.ComicStats.comic_id),
+        )
+    elif sort == "trending":
+        stmt = stmt.order_by(desc(m.ComicStats.trending_score), desc(m.ComicStats.comic_id))
     else:  
-        stmt = stmt.order_by(nullslast(desc(avg_rating))) 
-    stmt = stmt.options(selectinload(m.Comic.genres))
-    offset = (page - 1) * limit
-    stmt = stmt.offset(offset).limit(limit)
+        stmt = stmt.order_by(nullslast(desc(m.ComicStats.avg_rating)), desc(m.ComicStats.comic_id))
 
-    result = await db.execute(stmt)
-    rows = result.all()
-    return [
-        {
-            **pyd.ComicBase.from_orm(row[0]).dict(),
-            "average_rating": round(row[1], 2) if row[1] is not None else None,
-            "rating_count": row[2]
-        }
-        for row in rows
-    ]
+    async def load_page(db):
+        result = await db.execute(stmt.offset((page - 1) * limit).limit(limit))
+        return _cards(result.scalars().all())
+
+    async def load_cursor_page(db):
+        cursor_stmt = stmt.where(_comics_after(sort, cursor)) if cursor else stmt
+        result = await db.execute(cursor_stmt.limit(limit + 1))
+        comics = result.scalars().all()
+        next_cursor = _comic_cursor(sort, comics[limit - 1]) if len(comics) > limit else None
+        return pyd.ComicPage(items=_cards(comics[:limit]), next_cursor=next_cursor)
+
+    loader = load_page if cursor is None else load_cursor_page
+    # Первые страницы одинаковы для всех посетителей
+    if (cursor is None and page <= settings.CACHE_CATALOG_PAGES) or cursor == "":
+        key = ("comics", tuple(sorted(genres)), min_rating, sort, page if cursor is None else "", limit)
+        return await response_cache.get_or_load(key, from_primary(loader), tags=("comics", "ratings"))
+    return await loader(db)
     
-@router.get("/search", response_model=List[pyd.ComicBase])
+@router.get("/search", response_model=Union[List[pyd.ComicBase], pyd.ComicPage])
 async def search_comics_by_title(
-    title: Optional[str] = Query(None),
-    db: AsyncSession = Depends(get_db),
+    title: Optional[str] = Query(None, max_length=255),
+    genres: List[int] = Query(default=[]),
+    limit: int = Query(default=10, ge=1, le=30),
+    cursor: Optional[str] = Query(default=None, description="Пустая строка — первая страница в режиме курсора"),
+    db: AsyncSession = Depends(get_read_db),
 ):
-    stmt = select(m.Comic).options(selectinload(m.Comic.genres))
+    comics, next_cursor = await search.search_comics(db, title, genres, limit, cursor)
+    if cursor is None:
+        return comics
+    return {"items": comics, "next_cursor": next_cursor}
 
-    if title:
-        stmt = stmt.where(m.Comic.title.ilike(f"%{title}%"))
+async def _comics_by_score(db: AsyncSession, scores) -> List[pyd.ComicBase]:
+    # scores — подзапрос (id, score); карточки в порядке убывания score
+    comics = await db.execute(
+        select(m.Comic)
+        .join(scores, scores.c.id == m.Comic.id)
+        .order_by(scores.c.score.desc(), m.Comic.id)
+        .options(*load_profiles.CARD)
+    )
+    return _cards(comics.scalars().all())
 
-    result = await db.execute(stmt)
-    comics = result.scalars().all()
-    return comics
+def _user_comics(user_id: int):
+    # Комиксы, оценённые пользователем, и его избранное
+    rated = select(m.Rating.comic_id).where(m.Rating.user_id == user_id)
+    favorite = select(m.user_favorite_comics.c.comic_id).where(m.user_favorite_comics.c.user_id == user_id)
+    return rated.union(favorite)
+
+def _seed_comics(user_id: int, min_rating: int, limit: int):
+    # До limit комиксов, которые пользователь недавно оценил не ниже
+    # min_rating или добавил в избранное; без даты (старые записи) — в конце
+    rated = select(m.Rating.comic_id, m.Rating.created_at).where(
+        m.Rating.user_id == user_id, m.Rating.value >= min_rating
+    )
+    favorite = select(m.user_favorite_comics.c.comic_id, m.user_favorite_comics.c.created_at).where(
+        m.user_favorite_comics.c.user_id == user_id
+    )
+    events = union_all(rated, favorite).subquery()
+    return (
+        select(events.c.comic_id)
+        .group_by(events.c.comic_id)
+        .order_by(nullslast(func.max(events.c.created_at).desc()), events.c.comic_id.desc())
+        .limit(limit)
+    )
 
 @router.get("/recomm", response_model=List[pyd.ComicBase])
-async def get_all_comics_reccom(db: AsyncSession = Depends(get_db)):
-    comics = await db.execute(select(m.Comic).where(m.Comic.website_recommendation == True))
-    comics_list = comics.scalars().all()
-    return comics_list
+async def get_all_comics_reccom(
+    limit: int = Query(default=20, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[CurrentUser] = Depends(get_optional_user),
+):
+    # Вошедшему пользователю — комиксы, похожие на понравившиеся ему и ещё
+    # не оценённые; анониму и пользователю без истории — подборка редакции.
+    # Личная подборка не кэшируется: ключи по пользователям вытесняли бы
+    # общие записи response_cache, а избранное меняет её сразу.
+    if current_user is not None:
+        seeds = _seed_comics(current_user.id, 7, settings.RECOMMEND_USER_SEEDS).subquery()
+        scores = (
+            select(
+                m.ComicSimilarity.similar_id.label("id"),
+                func.sum(m.ComicSimilarity.score).label("score"),
+            )
+            .where(
+                m.ComicSimilarity.comic_id.in_(select(seeds.c.comic_id)),
+                m.ComicSimilarity.similar_id.not_in(_user_comics(current_user.id)),
+            )
+            .group_by(m.ComicSimilarity.similar_id)
+            .order_by(func.sum(m.ComicSimilarity.score).desc())
+            .limit(limit)
+            .subquery()
+        )
+        personal = await _comics_by_score(db, scores)
+        if personal:
+            return personal
 
-@router.get("/new_5", response_model=List[pyd.ComicBase])
-async def get_five_new_comics(db: AsyncSession = Depends(get_db)):
-    comics = await db.execute(select(m.Comic).order_by(desc(m.Comic.date_of_out)).limit(5)) 
-    comics_list = comics.scalars().all()
-    return comics_list
+    async def load(db):
+        comics = await db.execute(
+            select(m.Comic)
+            .where(m.Comic.website_recommendation == True)
+            .options(*load_profiles.CARD)
+        )
+        return _cards(comics.scalars().all())
 
+    return await response_cache.get_or_load("recomm", from_primary(load), tags=("comics", "ratings"))
 
-@router.get("/favorites/{nick}", response_model=List[pyd.ComicBase])
-async def get_favorite_comics_by_nick(nick: str, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(m.User)
-        .options(selectinload(m.User.favorite_comics))
-        .where(m.User.nick == nick)
-    )
-    user = result.scalar_one_or_none()
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="Пользователь не найден")
+@router.get("/{comic_id}/similar", response_model=List[pyd.ComicBase])
+async def get_similar_comics(
+    comic_id: int,
+    limit: int = Query(default=10, ge=1, le=50),
+):
+    # Готовый top-K из comic_similarities: диапазон по индексу (comic_id, score)
+    async def load(db):
+        scores = (
+            select(m.ComicSimilarity.similar_id.label("id"), m.ComicSimilarity.score)
+            .where(m.ComicSimilarity.comic_id == comic_id)
+            .order_by(m.ComicSimilarity.score.desc())
+            .limit(limit)
+            .subquery()
+        )
+        return await _comics_by_score(db, scores)
 
-    sorted_comics = sorted(user.favorite_comics, key=lambda c: c.title.lower())
+    return await response_cache.get_or_load(("similar", comic_id, limit), from_primary(load), tags=("comics",))
 
-    for comic in sorted_comics:
-        rating_stmt = select(func.avg(m.Rating.value)).where(m.Rating.comic_id == comic.id)
-        rating_result = await db.execute(rating_stmt)
-        comic.average_rating = rating_result.scalar()
+@router.get("/new_5", response_model=List[pyd.ComicBase])
+async def get_five_new_comics():
+    async def load(db):
+        comics = await db.execute(
+            select(m.Comic)
+            .order_by(desc(m.Comic.date_of_out))
+            .limit(5)
+            .options(*load_profiles.CARD)
+        )
+        return _cards(comics.scalars().all())
 
-    return sorted_comics
+    return await response_cache.get_or_load("new_5", from_primary(load), tags=("comics", "ratings"))
 
-@router.get("/comics/{comic_id}", response_model=pyd.ComicResponse)
-async def get_comic_by_id(
-    comic_id: int,
-    db: AsyncSession = Depends(get_db),
+
+@router.get("/favorites/{nick}", response_model=Union[List[pyd.ComicBase], pyd.ComicPage])
+async def get_favorite_comics_by_nick(
+    nick: str,
+    limit: Optional[int] = Query(default=None, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Пустая строка — первая страница в режиме курсора"),
+    db: AsyncSession = Depends(get_read_db),
 ):
+    sort_key = func.lower(m.Comic.title)
     stmt = (
-    select(m.Comic)
-    .where(m.Comic.id == comic_id)
-    .options(
-        selectinload(m.Comic.user),
-        selectinload(m.Comic.genres),
-        selectinload(m.Comic.volumes)
-        .selectinload(m.Volume.chapters)
-        .options(noload(m.Chapter.pages)),
-    )
+        select(m.Comic, sort_key)
+        .join(m.user_favorite_comics, m.user_favorite_comics.c.comic_id == m.Comic.id)
+        .join(m.User, m.User.id == m.user_favorite_comics.c.user_id)
+        .where(m.User.nick == nick)
+        .options(*load_profiles.CARD)
+        .order_by(sort_key, m.Comic.id)
     )
+    if cursor:
+        after = decode_cursor(cursor)
+        title, comic_id = after.get("k"), after.get("id")
+        if not isinstance(title, str) or not isinstance(comic_id, int):
+            raise HTTPException(status_code=400, detail="Некорректный курсор")
+        stmt = stmt.where(or_(sort_key > title, and_(sort_key == title, m.Comic.id > comic_id)))
+    if cursor is not None:
+        limit = limit or 30
+    if limit is not None:
+        stmt = stmt.limit(limit + 1)
+
     result = await db.execute(stmt)
-    comic = result.scalars().first()
+    rows = result.all()
 
-    if not comic:
-        raise HTTPException(status_code=404, detail="Комикс не найден")
+    if not rows and not cursor:
+        user_exists = await db.scalar(select(m.User.id).where(m.User.nick == nick))
+        if user_exists is None:
+            raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    rating_stmt = select(func.avg(m.Rating.value)).where(m.Rating.comic_id == comic_id)
-    rating_result = await db.execute(rating_stmt)
-    average_rating = rating_result.scalar()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        comic, title = rows[limit - 1]
+        next_cursor = encode_cursor({"k": title, "id": comic.id})
+        rows = rows[:limit]
+    comics = [row[0] for row in rows]
 
-    comic.average_rating = average_rating
+    if cursor is None:
+        return comics
+    return {"items": comics, "next_cursor": next_cursor}
 
-    return comic
+@router.get("/comics/{comic_id}", response_model=pyd.ComicResponse)
+async def get_comic_by_id(comic_id: int):
+    document = await comic_detail.get_document(comic_id)
+    return Response(content=document, media_type="application/json")
 
 @router.get("/chapters/{chapter_id}", response_model=list[pyd.PageResponse])
 async def get_pages_by_chapter_id(
     chapter_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     stmt = (
         select(m.Page)
         .where(m.Page.chapter_id == chapter_id)
         .order_by(m.Page.number)
+        .options(*load_profiles.READER)
     )
     result = await db.execute(stmt)
     pages = result.scalars().all()
@@ -158,15 +325,111 @@ async def get_pages_by_chapter_id(
 
     return pages
 
+def _neighbour_chapter(current, forward: bool):
+    # Соседняя глава того же комикса по порядку (номер тома, номер главы),
+    # в том числе через границу тома
+    position = tuple_(m.Volume.number, m.Chapter.number)
+    here = tuple_(current.c.volume_number, current.c.number)
+    if forward:
+        condition, order = position > here, (m.Volume.number, m.Chapter.number)
+    else:
+        condition, order = position < here, (m.Volume.number.desc(), m.Chapter.number.desc())
+    return (
+        select(m.Chapter.id)
+        .join(m.Volume, m.Volume.id == m.Chapter.volume_id)
+        .where(m.Volume.comic_id == current.c.comic_id, condition)
+        .order_by(*order)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+def _file_url(path: str) -> str:
+    return "/" + quote(path)
+
+def _preload_links(pages) -> str:
+    links = []
+    for page in pages:
+        link = f"<{_file_url(page.image_url)}>; rel=preload; as=image"
+        srcset = ", ".join(
+            f"{_file_url(variant.url)} {variant.width}w"
+            for variant in page.variants
+            if variant.format == "webp"
+        )
+        if srcset:
+            link += f'; imagesrcset="{srcset}"; imagesizes="100vw"'
+        links.append(link)
+    return ", ".join(links)
+
+@router.get("/chapters/{chapter_id}/read", response_model=pyd.ReaderChapterResponse)
+async def read_chapter(
+    chapter_id: int,
+    response: Response,
+    prefetch: int = Query(default=settings.READER_PREFETCH_PAGES, ge=0, le=20),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Страницы главы, соседние главы и начало следующей главы:
+    # читалке не нужно загружать дерево томов через /comics/{comic_id}
+    current = (
+        select(
+            m.Chapter.id,
+            m.Chapter.number,
+            m.Chapter.title,
+            m.Volume.number.label("volume_number"),
+            m.Volume.comic_id,
+        )
+        .join(m.Volume, m.Volume.id == m.Chapter.volume_id)
+        .where(m.Chapter.id == chapter_id)
+        .subquery("current")
+    )
+    result = await db.execute(
+        select(
+            current,
+            _neighbour_chapter(current, forward=False).label("prev_chapter_id"),
+            _neighbour_chapter(current, forward=True).label("next_chapter_id"),
+        )
+    )
+    chapter = result.mappings().first()
+    if chapter is None:
+        raise HTTPException(status_code=404, detail="Глава не найдена")
+
+    next_chapter_id = chapter["next_chapter_id"]
+    wanted = m.Page.chapter_id == chapter_id
+    if next_chapter_id is not None and prefetch:
+        first_pages = (
+            select(m.Page.id)
+            .where(m.Page.chapter_id == next_chapter_id)
+            .order_by(m.Page.number)
+            .limit(prefetch)
+        )
+        wanted = or_(wanted, m.Page.id.in_(first_pages))
+    result = await db.execute(
+        select(m.Page.chapter_id, m.Page)
+        .where(wanted)
+        .order_by(m.Page.number)
+        .options(*load_profiles.READER)
+    )
+    pages, next_pages = [], []
+    for page_chapter_id, page in result.all():
+        (pages if page_chapter_id == chapter_id else next_pages).append(page)
+
+    if next_pages:
+        response.headers["Link"] = _preload_links(next_pages)
+
+    return {**chapter, "pages": pages, "next_pages": next_pages}
+
 @router.post("/{comic_id}/favorite")
 async def add_comic_to_favorites(
     comic_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     stmt = pg_insert(m.user_favorite_comics).values(user_id=current_user.id, comic_id=comic_id)
     stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "comic_id"])
     await db.execute(stmt)
+    # Для trending считается только первое добавление
+    stmt = pg_insert(m.FavoriteEvent).values(user_id=current_user.id, comic_id=comic_id)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "comic_id"])
+    await db.execute(stmt)
     await db.commit()
     return {"message": "Комикс добавлен в любимое"}
 
@@ -174,7 +437,7 @@ async def add_comic_to_favorites(
 async def remove_comic_from_favorites(
     comic_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     stmt = delete(m.user_favorite_comics).where(
         m.user_favorite_comics.c.user_id == current_user.id,
@@ -187,8 +450,8 @@ async def remove_comic_from_favorites(
 @router.get("/{comic_id}/is_favorite", response_model=bool)
 async def is_comic_favorite(
     comic_id: int,
-    db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user),
 ):
     stmt = select(m.user_favorite_comics).where(
         m.user_favorite_comics.c.user_id == current_user.id,
@@ -1,35 +1,77 @@
-from fastapi import FastAPI, HTTPException, Depends, APIRouter, UploadFile, Query
+import io
+from fastapi import FastAPI, HTTPException, Depends, APIRouter, UploadFile, Query, File
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
 from fastapi.middleware.cors import CORSMiddleware
-from database import get_db
+from database import get_db, get_read_db
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import label, select, desc, func, asc, nullslast, delete
-from sqlalchemy.orm import selectinload, noload
+from sqlalchemy import label, select, desc, func, asc, nullslast, delete, tuple_, or_
+from sqlalchemy.orm import selectinload, noload, joinedload
 from sqlalchemy.dialects.postgresql import insert as pg_insert
 import models as m
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Union
 import pyd
 from sqlalchemy.sql.functions import coalesce
-from auth import get_current_user
+from auth import get_current_user, CurrentUser
+import comic_stats
+import comic_detail
+from cache import response_cache
+from pagination import encode_cursor, decode_cursor
 
 router = APIRouter(
     prefix="/comm",
     tags=["comm"],
 )
 
-@router.get("/{comic_id}/comments", response_model=List[pyd.CommentBase])
-async def get_comments(comic_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(m.Comment).where(m.Comment.comicID == comic_id).options(selectinload(m.Comment.user))
+@router.get("/{comic_id}/comments", response_model=Union[List[pyd.CommentItem], pyd.CommentPage])
+async def get_comments(
+    comic_id: int,
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Пустая строка — первая страница в режиме курсора"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    stmt = (
+        select(m.Comment)
+        .where(m.Comment.comicID == comic_id)
+        .options(joinedload(m.Comment.user).load_only(m.User.email, m.User.nick))
+        .order_by(nullslast(m.Comment.created_at.desc()), m.Comment.id.desc())
     )
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            created_at = datetime.fromisoformat(after["t"]) if after["t"] is not None else None
+            comment_id = int(after["id"])
+        except (KeyError, TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail="Некорректный курсор") from e
+        # Комментарии без даты (старше колонки created_at) идут после датированных
+        if created_at is None:
+            stmt = stmt.where(m.Comment.created_at.is_(None), m.Comment.id < comment_id)
+        else:
+            stmt = stmt.where(or_(
+                tuple_(m.Comment.created_at, m.Comment.id) < tuple_(created_at, comment_id),
+                m.Comment.created_at.is_(None),
+            ))
+
+    result = await db.execute(stmt.limit(limit + 1))
     comments = result.scalars().all()
-    return comments
+    next_cursor = None
+    if len(comments) > limit:
+        last = comments[limit - 1]
+        created_at = last.created_at.isoformat() if last.created_at is not None else None
+        next_cursor = encode_cursor({"t": created_at, "id": last.id})
+        comments = comments[:limit]
 
-@router.post("/{comic_id}/comments", response_model=pyd.CommentBase)
+    if cursor is None:
+        return comments
+    return {"items": comments, "next_cursor": next_cursor}
+
+@router.post("/{comic_id}/comments", response_model=pyd.CommentItem)
 async def create_comment(
     comic_id: int,
     comment_data: pyd.CommentCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     comment = m.Comment(
         comicID=comic_id,
@@ -37,35 +79,62 @@ async def create_comment(
         comment=comment_data.comment
     )
     db.add(comment)
+    await comic_stats.change_comment_count(db, comic_id, 1)
     await db.commit()
+    comic_detail.invalidate(comic_id)
     await db.refresh(comment)
-    return comment
+    return {
+        "id": comment.id,
+        "userID": comment.userID,
+        "comicID": comment.comicID,
+        "comment": comment.comment,
+        "created_at": comment.created_at,
+        "user": {"email": current_user.email, "nick": current_user.nick},
+    }
 
-@router.post("/{comic_id}/rate", response_model=pyd.RatingBase)
+@router.post("/{comic_id}/rate", response_model=pyd.RatingResult)
 async def rate_comic(
     comic_id: int,
     rating_data: pyd.RatingCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: m.User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(m.Rating).where(
-            m.Rating.comic_id == comic_id,
-            m.Rating.user_id == current_user.id
+    try:
+        average_rating, rating_count = await comic_stats.upsert_rating(
+            db, current_user.id, comic_id, rating_data.value
         )
-    )
-    rating = result.scalar_one_or_none()
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail="Комикс не найден")
+    await db.commit()
+    response_cache.invalidate_tags("ratings")
+    comic_detail.invalidate(comic_id)
+    return {
+        "value": rating_data.value,
+        "average_rating": round(average_rating, 2) if average_rating is not None else None,
+        "rating_count": rating_count or 0,
+    }
 
-    if rating:
-        rating.value = rating_data.value
-    else:
-        rating = m.Rating(
-            comic_id=comic_id,
-            user_id=current_user.id,
-            value=rating_data.value
-        )
-        db.add(rating)
+@router.post("/ratings/import")
+async def import_ratings(
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if current_user.roleId != 1:
+        raise HTTPException(status_code=403, detail="Недостаточно прав")
+
+    text_file = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    batches = comic_stats.csv_rating_batches(text_file)
+
+    async def read_batches():
+        # Чтение и разбор CSV — в пуле потоков, чтобы не блокировать цикл событий
+        while batch := await run_in_threadpool(next, batches, None):
+            yield batch
 
+    try:
+        report = await comic_stats.import_ratings(db, read_batches())
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail="Некорректный CSV: ожидаются user_id,comic_id,value[,created_at]") from e
     await db.commit()
-    await db.refresh(rating)
-    return rating
+    response_cache.invalidate_tags("ratings", "comic_details")
+    return report
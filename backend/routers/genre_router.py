@@ -1,13 +1,14 @@
 from datetime import datetime
 from fastapi import FastAPI, HTTPException, Depends, APIRouter, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from database import get_db
+from database import from_primary
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, asc
 from sqlalchemy.orm import selectinload, joinedload
 import models as m
 from typing import List
 import pyd
+from cache import response_cache
 
 router = APIRouter(
     prefix="/genre",
@@ -15,7 +16,9 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[pyd.GenreBase])
-async def get_all_genre(db: AsyncSession = Depends(get_db)):
-    genres = await db.execute(select(m.Genre).order_by(asc(m.Genre.name))) 
-    genres_list = genres.scalars().all()
-    return genres_list
+async def get_all_genre():
+    async def load(db):
+        genres = await db.execute(select(m.Genre).order_by(asc(m.Genre.name))) 
+        return [pyd.GenreBase.model_validate(genre, from_attributes=True) for genre in genres.scalars().all()]
+
+    return await response_cache.get_or_load("genres", from_primary(load), tags=("genres",))
@@ -1,7 +1,7 @@
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, and_, update
 from sqlalchemy.orm import selectinload
 from database import get_db
 import models as m
@@ -39,7 +39,7 @@ async def register_user(
             detail="Этот ник уже используется"
         )
 
-    hashed_password = utils.hash_password(user_data.password)
+    hashed_password = await utils.hash_password_async(user_data.password)
 
     # Создание пользователя
     new_user = m.User(
@@ -65,27 +65,46 @@ async def login(
     )
     user = user.scalar_one_or_none()
     
-    if not user or not utils.verify_password(form_data.password, user.password):
+    if not user or not await utils.verify_password_async(form_data.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    if utils.needs_rehash(user.password):
+        user.password = await utils.hash_password_async(form_data.password)
+        await db.commit()
     
     access_token = auth.create_access_token(
         data={"sub": user.email, 
               "nick": user.nick,
               "id": user.id, 
-              "role": user.roleId
+              "role": user.roleId,
+              "ver": user.token_version
               }
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=pyd.UserResponse)
-async def read_users_me(current_user: m.User = Depends(auth.get_current_user)):
+async def read_users_me(current_user: auth.CurrentUser = Depends(auth.get_current_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
         "nick": current_user.nick,
-    }
\ No newline at end of file
+    }
+
+@router.post("/logout_all")
+async def logout_all(
+    current_user: auth.CurrentUser = Depends(auth.get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    await db.execute(
+        update(m.User)
+        .where(m.User.id == current_user.id)
+        .values(token_version=m.User.token_version + 1)
+    )
+    await db.commit()
+    auth.user_cache.invalidate_tags(auth.user_tag(current_user.id))
+    return {"detail": "Все сессии завершены"}
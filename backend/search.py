@@ -0,0 +1,83 @@
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import select, func, case, cast, and_, or_, literal, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+import models as m
+from pagination import encode_cursor, decode_cursor
+import load_profiles
+
+
+def _trigram_rank(query: str):
+    # pg_trgm: similarity/word_similarity дают устойчивость к опечаткам,
+    # совпадение подстрокой в названии поднимает результат выше
+    title_rank = func.greatest(
+        func.similarity(m.Comic.title, query),
+        func.word_similarity(query, m.Comic.title),
+    )
+    desc_rank = func.word_similarity(query, func.coalesce(m.Comic.desc, "")) * 0.5
+    bonus = case(
+        (m.Comic.title.istartswith(query, autoescape=True), 0.5),
+        (m.Comic.title.icontains(query, autoescape=True), 0.25),
+        else_=0.0,
+    )
+    rank = cast(func.greatest(title_rank, desc_rank) + bonus, Float)
+    match = or_(
+        m.Comic.title.icontains(query, autoescape=True),
+        m.Comic.title.op("%")(query),
+        literal(query).op("<%")(m.Comic.title),
+        literal(query).op("<%")(m.Comic.desc),
+    )
+    return rank, match
+
+
+def _invalid_cursor():
+    return HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+async def search_comics(
+    db: AsyncSession,
+    query: Optional[str],
+    genres: List[int],
+    limit: int,
+    cursor: Optional[str] = None,
+):
+    query = (query or "").strip()
+    stmt = select(m.Comic).options(*load_profiles.CARD)
+    if genres:
+        stmt = stmt.where(
+            m.Comic.id.in_(
+                select(m.ComicGenre.comic_id).where(m.ComicGenre.genre_id.in_(genres))
+            )
+        )
+
+    after = decode_cursor(cursor) if cursor else None
+    if after is not None and (after.get("q") != query or not isinstance(after.get("id"), int)):
+        raise _invalid_cursor()
+
+    if not query:
+        stmt = stmt.add_columns(m.Comic.title).order_by(m.Comic.title, m.Comic.id)
+        if after is not None:
+            title = after.get("k")
+            if not isinstance(title, str):
+                raise _invalid_cursor()
+            stmt = stmt.where(
+                or_(m.Comic.title > title, and_(m.Comic.title == title, m.Comic.id > after["id"]))
+            )
+    else:
+        rank, match = _trigram_rank(query)
+        stmt = stmt.add_columns(rank).where(match).order_by(rank.desc(), m.Comic.id)
+        if after is not None:
+            last_rank = after.get("k")
+            if not isinstance(last_rank, (int, float)):
+                raise _invalid_cursor()
+            stmt = stmt.where(
+                or_(rank < last_rank, and_(rank == last_rank, m.Comic.id > after["id"]))
+            )
+
+    result = await db.execute(stmt.limit(limit + 1))
+    rows = result.all()
+    next_cursor = None
+    if len(rows) > limit:
+        comic, key = rows[limit - 1]
+        next_cursor = encode_cursor({"q": query, "k": key, "id": comic.id})
+    return [row[0] for row in rows[:limit]], next_cursor
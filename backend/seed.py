@@ -1,12 +1,15 @@
 import asyncio
 import os
-import shutil
 from datetime import date
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from database import engine
 import models as m
 import bcrypt
+import comic_stats
+import migrate
+import author_stats
+from generate import link_file
 
 FILES_ROOT = "files"
 SEED_PAGES_FOLDER = os.path.join(FILES_ROOT, "seed/test")
@@ -16,9 +19,10 @@ VALID_IMAGE_EXTENSIONS = [".jpg", ".png"]
 salt = bcrypt.gensalt()
 
 async def seed():
+    # schema_migrations зарегистрирована в Base.metadata и удаляется вместе со схемой
     async with engine.begin() as conn:
         await conn.run_sync(m.Base.metadata.drop_all)
-        await conn.run_sync(m.Base.metadata.create_all)
+    await migrate.upgrade()
 
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
@@ -90,7 +94,7 @@ async def seed():
             dest_poster_path = os.path.join(poster_folder, poster_filename)
 
             if os.path.exists(SEED_POSTER_PATH):
-                shutil.copyfile(SEED_POSTER_PATH, dest_poster_path)
+                link_file(SEED_POSTER_PATH, dest_poster_path)
                 relative_img_path = os.path.relpath(dest_poster_path, FILES_ROOT).replace("\\", "/")
                 comic.img = relative_img_path
             else:
@@ -118,7 +122,7 @@ async def seed():
 
                 source_path = os.path.join(SEED_PAGES_FOLDER, file_name)
                 dest_path = os.path.join(target_chapter_folder_1, file_name)
-                shutil.copyfile(source_path, dest_path)
+                link_file(source_path, dest_path)
 
                 relative_path = os.path.relpath(dest_path, FILES_ROOT).replace("\\", "/")
                 page = m.Page(
@@ -146,7 +150,7 @@ async def seed():
 
                     source_path = os.path.join(SEED_PAGES_FOLDER, file_name)
                     dest_path = os.path.join(target_chapter_folder_2, file_name)
-                    shutil.copyfile(source_path, dest_path)
+                    link_file(source_path, dest_path)
 
                     relative_path = os.path.relpath(dest_path, FILES_ROOT).replace("\\", "/")
                     page = m.Page(
@@ -171,6 +175,10 @@ async def seed():
         session.add_all(comments)
 
         await session.execute(m.user_favorite_comics.insert().values(user_id=aftor_user.id, comic_id=comic1.id))
+        await session.flush()
+
+        await comic_stats.rebuild_comic_stats(session)
+        await author_stats.rebuild_author_stats(session)
 
         await session.commit()
 
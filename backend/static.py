@@ -0,0 +1,68 @@
+import mimetypes
+import os
+import re
+import stat
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+from starlette.types import Scope
+
+# Имена из storage.versioned_path: 12.3f9a2c81d0e4.jpg — префикс sha256
+# содержимого перед расширением; варианты images.py: 12.3f9a2c81d0e4.480.webp
+VERSIONED_NAME = re.compile(r"\.[0-9a-f]{12}(?:\.\d+)?(?:\.[^.]+)?$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def is_versioned(path: str) -> bool:
+    # Параметр ?v= не в счёт: по нему нельзя понять, сменится ли URL
+    # вместе с содержимым
+    return VERSIONED_NAME.search(os.path.basename(path)) is not None
+
+
+def strong_etag(stat_result: os.stat_result, encoding: str = "") -> str:
+    tag = f"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+    if encoding:
+        tag = f"{tag}-{encoding}"
+    return f'"{tag}"'
+
+
+class ComicStaticFiles(StaticFiles):
+    # StaticFiles с сильным ETag, готовыми .br/.gz рядом с файлом и
+    # Cache-Control: immutable для версионированных имён.
+    # Range и If-Range обрабатывает сам FileResponse.
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        accept_encoding = request_headers.get("accept-encoding", "")
+
+        path, encoding = full_path, ""
+        for name, suffix in PRECOMPRESSED:
+            if name not in accept_encoding:
+                continue
+            try:
+                compressed_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            if stat.S_ISREG(compressed_stat.st_mode):
+                path, stat_result, encoding = f"{full_path}{suffix}", compressed_stat, name
+                break
+
+        # Тип определяем по исходному имени, а не по .br/.gz
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+        response.headers["etag"] = strong_etag(stat_result, encoding)
+        response.headers["vary"] = "Accept-Encoding"
+        if encoding:
+            response.headers["content-encoding"] = encoding
+        response.headers["cache-control"] = IMMUTABLE if is_versioned(full_path) else REVALIDATE
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
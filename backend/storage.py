@@ -0,0 +1,123 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+from typing import Optional
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from config import settings
+
+# Ограничивает число одновременных записей на диск во всём процессе
+_write_slots = asyncio.Semaphore(settings.UPLOAD_MAX_CONCURRENT_WRITES)
+
+
+class UploadBudget:
+    # Общий лимит байт на один запрос
+    def __init__(self, max_bytes: int):
+        self.remaining = max_bytes
+
+    def consume(self, size: int):
+        self.remaining -= size
+        if self.remaining < 0:
+            raise HTTPException(status_code=413, detail="Превышен общий размер загрузки")
+
+
+async def makedirs(path: str):
+    await run_in_threadpool(os.makedirs, path, exist_ok=True)
+
+
+async def rename_if_exists(src: str, dest: str):
+    def _rename():
+        try:
+            os.rename(src, dest)
+        except FileNotFoundError:
+            pass
+    await run_in_threadpool(_rename)
+
+
+async def remove_files(paths):
+    def _remove():
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    await run_in_threadpool(_remove)
+
+
+def versioned_path(path: str, digest: str) -> str:
+    # 1.jpg -> 1.3f9a2c81d0e4.jpg: новое содержимое получает новый URL,
+    # поэтому статику можно отдавать с Cache-Control: immutable
+    root, extension = os.path.splitext(path)
+    return f"{root}.{digest[:12]}{extension}"
+
+
+async def save_upload(
+    upload: UploadFile,
+    path: str,
+    budget: Optional[UploadBudget] = None,
+    versioned: bool = True,
+) -> str:
+    # Копирует файл кусками по UPLOAD_CHUNK_SIZE, запись идёт в пуле потоков.
+    # Файл появляется под итоговым именем только после полной записи.
+    # Возвращает итоговый путь (с хэшем содержимого, если versioned).
+    tmp_path = f"{path}.part"
+    written = 0
+    digest = hashlib.sha256()
+    async with _write_slots:
+        f = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while chunk := await upload.read(settings.UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > settings.UPLOAD_MAX_FILE_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Файл {upload.filename} слишком большой")
+                if budget is not None:
+                    budget.consume(len(chunk))
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        except BaseException:
+            await run_in_threadpool(f.close)
+            await remove_files([tmp_path])
+            raise
+        await run_in_threadpool(f.close)
+        if versioned:
+            path = versioned_path(path, digest.hexdigest())
+        await run_in_threadpool(os.replace, tmp_path, path)
+    return path
+
+
+def _copy_stream(open_source, path: str, budget: Optional[UploadBudget], versioned: bool):
+    tmp_path = f"{path}.part"
+    written = 0
+    digest = hashlib.sha256()
+    try:
+        with open_source() as src, open(tmp_path, "wb") as dst:
+            while chunk := src.read(settings.UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > settings.UPLOAD_MAX_FILE_BYTES:
+                    raise HTTPException(status_code=413, detail=f"Файл {os.path.basename(path)} слишком большой")
+                if budget is not None:
+                    budget.consume(len(chunk))
+                digest.update(chunk)
+                dst.write(chunk)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    if versioned:
+        path = versioned_path(path, digest.hexdigest())
+    os.replace(tmp_path, path)
+    return path
+
+
+async def save_stream(
+    open_source,
+    path: str,
+    budget: Optional[UploadBudget] = None,
+    versioned: bool = True,
+) -> str:
+    # Как save_upload, но источник — синхронный файловый объект (элемент
+    # архива, файл на диске): open_source() открывает его, копирование
+    # целиком идёт в пуле потоков
+    async with _write_slots:
+        return await run_in_threadpool(_copy_stream, open_source, path, budget, versioned)
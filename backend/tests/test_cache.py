@@ -0,0 +1,40 @@
+import asyncio
+from cache import TTLCache
+
+
+async def test_waiters_share_one_load():
+    cache = TTLCache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    results = await asyncio.gather(*(cache.get_or_load("key", loader) for _ in range(5)))
+    assert results == [1] * 5
+    assert calls == 1
+
+
+async def test_cancelled_loader_does_not_cancel_waiters():
+    # Отменён только запрос, начавший загрузку; ожидающий загружает сам
+    cache = TTLCache()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return "value"
+
+    first = asyncio.create_task(cache.get_or_load("key", slow))
+    await started.wait()
+    waiter = asyncio.create_task(cache.get_or_load("key", fast))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await waiter == "value"
+    assert first.cancelled()
+    assert cache.get("key") == "value"
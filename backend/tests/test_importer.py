@@ -0,0 +1,65 @@
+import pytest
+from fastapi import HTTPException
+from importer import Entry, _locate, plan
+
+
+def entries(*names):
+    return [Entry(name, 0, None) for name in names]
+
+
+def layout_names(layout):
+    # [(том, глава, [имена страниц])]
+    return [
+        (volume["number"], chapter["number"], [entry.name.rpartition("/")[2] for entry in chapter["pages"]])
+        for volume in layout
+        for chapter in volume["chapters"]
+    ]
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Vol 2/Chapter 5/003.jpg", (2, 5)),
+    ("v02/c005/3.png", (2, 5)),
+    ("Vol.1 Ch.2/1.jpg", (1, 2)),
+    ("Berserk/Том 3/Глава 12/1.jpg", (3, 12)),
+    ("Series/01/002/1.jpg", (1, 2)),
+    ("ch5/3.jpg", (None, 5)),
+    ("Series/Prologue/1.jpg", (None, None)),
+    ("3.jpg", (None, None)),
+])
+def test_locate(name, expected):
+    assert _locate(name) == expected
+
+
+def test_plan_flat_cbz_keeps_volumes():
+    layout = plan(entries(
+        "Vol.02 Ch.001/2.jpg",
+        "Vol.01 Ch.002/1.jpg",
+        "Vol.01 Ch.001/10.jpg",
+        "Vol.01 Ch.001/2.jpg",
+        "Vol.02 Ch.001/1.jpg",
+    ), first_volume=4)
+    assert layout_names(layout) == [
+        (4, 1, ["2.jpg", "10.jpg"]),
+        (4, 2, ["1.jpg"]),
+        (5, 1, ["1.jpg", "2.jpg"]),
+    ]
+
+
+def test_plan_orders_chapters_numerically():
+    layout = plan(entries(
+        "Comic/Volume 1/Chapter 10/1.jpg",
+        "Comic/Volume 1/Chapter 9/1.jpg",
+        "Comic/Volume 1/Chapter 9/2.jpg",
+    ))
+    assert layout_names(layout) == [(1, 1, ["1.jpg", "2.jpg"]), (1, 2, ["1.jpg"])]
+
+
+def test_plan_flat_pages_make_one_chapter():
+    layout = plan(entries("2.png", "1.png"))
+    assert layout_names(layout) == [(1, 1, ["1.png", "2.png"])]
+
+
+def test_plan_rejects_empty_archive():
+    with pytest.raises(HTTPException) as error:
+        plan([])
+    assert error.value.status_code == 400
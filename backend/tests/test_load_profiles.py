@@ -0,0 +1,117 @@
+from datetime import date
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+import load_profiles
+import models as m
+import pyd
+
+# Число запросов и строк на эндпоинт не должно зависеть от числа комиксов:
+# ленивая загрузка в async-сессии либо падает, либо добавляет запросы.
+
+COMICS = 3
+PAGES = 4
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = 0
+        self.rows = 0
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_execute)
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements += 1
+        self.rows += max(cursor.rowcount or 0, 0)
+
+    def reset(self):
+        self.statements = 0
+        self.rows = 0
+
+
+@pytest.fixture
+async def seeded(test_engine):
+    async with AsyncSession(test_engine, expire_on_commit=False) as db:
+        role = m.Role(name="user")
+        user = m.User(email="author@example.com", nick="author", password="x", role=role)
+        genres = [m.Genre(name=f"Жанр {i}") for i in range(2)]
+        comics = []
+        for i in range(COMICS):
+            comic = m.Comic(
+                title=f"Комикс {i}",
+                desc="Описание",
+                date_of_out=date(2024, 1, 1),
+                website_recommendation=False,
+                img=f"comics/{i}/poster.jpg",
+                user=user,
+                genres=genres,
+                stats=m.ComicStats(),
+            )
+            comic.poster_variants = [
+                m.ImageVariant(width=w, height=w, format="webp", url=f"comics/{i}/poster.{w}.webp")
+                for w in (160, 320)
+            ]
+            chapter = m.Chapter(number=1, pages=[
+                m.Page(number=n, image_url=f"comics/{i}/{n}.jpg", variants=[
+                    m.ImageVariant(width=480, height=640, format="webp", url=f"comics/{i}/{n}.480.webp"),
+                ])
+                for n in range(1, PAGES + 1)
+            ])
+            comic.volumes = [m.Volume(number=1, chapters=[chapter])]
+            comics.append(comic)
+        db.add_all(comics)
+        await db.commit()
+        yield test_engine, comics
+
+
+async def test_card_queries(seeded):
+    engine, comics = seeded
+    counter = StatementCounter(engine)
+    async with AsyncSession(engine) as db:
+        result = await db.execute(select(m.Comic).options(*load_profiles.CARD).order_by(m.Comic.id))
+        cards = [pyd.ComicBase.model_validate(comic) for comic in result.scalars().unique()]
+    assert len(cards) == COMICS
+    # комиксы с comic_stats + варианты постеров
+    assert counter.statements == 2
+    assert counter.rows <= COMICS + COMICS * 2
+
+
+async def test_detail_queries(seeded):
+    engine, comics = seeded
+    counter = StatementCounter(engine)
+    async with AsyncSession(engine) as db:
+        result = await db.execute(
+            select(m.Comic).where(m.Comic.id == comics[0].id).options(*load_profiles.DETAIL)
+        )
+        detail = pyd.ComicResponse.model_validate(result.scalars().first())
+    assert [len(volume.chapters) for volume in detail.volumes] == [1]
+    # комикс со stats и автором, варианты постера, жанры, тома, главы; страницы не грузятся
+    assert counter.statements == 5
+    assert counter.rows <= 1 + 2 + 2 + 1 + 1
+
+
+async def test_reader_queries(seeded):
+    engine, comics = seeded
+    chapter_id = comics[0].volumes[0].chapters[0].id
+    counter = StatementCounter(engine)
+    async with AsyncSession(engine) as db:
+        result = await db.execute(
+            select(m.Page)
+            .where(m.Page.chapter_id == chapter_id)
+            .options(*load_profiles.READER)
+            .order_by(m.Page.number)
+        )
+        pages = [pyd.PageResponse.model_validate(page) for page in result.scalars()]
+    assert [page.number for page in pages] == list(range(1, PAGES + 1))
+    assert counter.statements == 2
+    assert counter.rows <= PAGES * 2
+
+
+async def test_admin_list_queries(seeded):
+    engine, comics = seeded
+    counter = StatementCounter(engine)
+    async with AsyncSession(engine) as db:
+        result = await db.execute(select(m.Comic).options(*load_profiles.ADMIN_LIST))
+        rows = [(comic.id, comic.title, comic.website_recommendation) for comic in result.scalars()]
+    assert len(rows) == COMICS
+    assert counter.statements == 1
+    assert counter.rows <= COMICS
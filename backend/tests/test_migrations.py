@@ -0,0 +1,65 @@
+import pytest
+from sqlalchemy import inspect, text
+from database import Base
+import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+import migrate
+
+
+def _schema(sync_conn):
+    inspector = inspect(sync_conn)
+    return {
+        table: (
+            {c["name"]: c["nullable"] for c in inspector.get_columns(table)},
+            {i["name"] for i in inspector.get_indexes(table)},
+        )
+        for table in inspector.get_table_names()
+    }
+
+
+@pytest.fixture
+async def empty_db(test_engine, monkeypatch):
+    async with test_engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+    monkeypatch.setattr(migrate, "engine", test_engine)
+    yield test_engine
+
+
+async def test_migrations_build_model_schema(empty_db):
+    # Все шаги на пустой базе дают ту же схему, что и модели
+    await migrate.upgrade()
+    async with empty_db.connect() as conn:
+        schema = await conn.run_sync(_schema)
+
+    for table in Base.metadata.sorted_tables:
+        if table.name == "schema_migrations":
+            continue
+        assert table.name in schema, table.name
+        columns, indexes = schema[table.name]
+        assert columns == {c.name: c.nullable for c in table.columns}, table.name
+        assert {index.name for index in table.indexes} <= indexes, table.name
+
+
+async def test_baseline_is_first_version(empty_db):
+    # После v0001 есть только исходные таблицы, без колонок и индексов из
+    # следующих шагов
+    await migrate.upgrade(1)
+    async with empty_db.connect() as conn:
+        schema = await conn.run_sync(_schema)
+
+    assert "comic_stats" not in schema
+    assert "jobs" not in schema
+    assert "token_version" not in schema["users"][0]
+    assert "created_at" not in schema["comments"][0]
+    assert "ix_pages_chapter_number" not in schema["pages"][1]
+
+
+async def test_migrations_are_idempotent(empty_db):
+    # База, созданная create_all до появления миграций, принимает все шаги
+    async with empty_db.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        await conn.run_sync(Base.metadata.create_all)
+    await migrate.upgrade()
+    async with empty_db.connect() as conn:
+        versions = await conn.scalars(text("SELECT version FROM schema_migrations"))
+        assert sorted(versions) == [version for version, _, _ in migrate.discover()]
@@ -0,0 +1,70 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from starlette.requests import Request
+from cache import TTLCache
+import database
+from conftest import TEST_DATABASE_URL
+
+# Вторая база — реплика; без TEST_REPLICA_URL роль реплики играет второй
+# движок на той же базе: тест проверяет выбор движка, а не репликацию
+REPLICA_URL = os.environ.get("TEST_REPLICA_URL", TEST_DATABASE_URL)
+
+
+def make_request(authorization=None) -> Request:
+    headers = [(b"authorization", authorization.encode())] if authorization else []
+    return Request({"type": "http", "headers": headers, "client": ("10.0.0.1", 1234)})
+
+
+@pytest.fixture
+async def replica(test_engine, monkeypatch):
+    engine = create_async_engine(REPLICA_URL, poolclass=NullPool)
+    monkeypatch.setattr(database, "replicas", database.ReplicaSet([engine]))
+    monkeypatch.setattr(database, "_recent_writers", TTLCache(maxsize=100, ttl=0.5))
+    yield engine
+    await engine.dispose()
+    await database.engine.dispose()
+
+
+async def write(request: Request):
+    async for db in database.get_db(request):
+        await db.execute(text("CREATE TEMP TABLE sticky_probe (id integer)"))
+        await db.execute(text("INSERT INTO sticky_probe VALUES (1)"))
+        await db.commit()
+
+
+async def read_bind(request: Request):
+    bind = None
+    async for db in database.get_read_db(request):
+        bind = db.bind
+    return bind
+
+
+async def test_read_after_write_goes_to_primary(replica):
+    writer = make_request("Bearer writer")
+    assert await read_bind(writer) is replica
+
+    await write(writer)
+    assert await read_bind(writer) is database.engine
+    # Другие клиенты продолжают читать с реплики
+    assert await read_bind(make_request("Bearer reader")) is replica
+
+    await asyncio.sleep(0.6)
+    assert await read_bind(writer) is replica
+
+
+async def test_anonymous_clients_are_not_sticky(replica):
+    await write(make_request())
+    assert await read_bind(make_request()) is replica
+
+
+async def test_shared_cache_fills_from_primary(replica):
+    # Общий кэш видят все клиенты: его заполняет только основная база
+    async def build(db):
+        await db.execute(text("SELECT 1"))
+        return db.bind
+
+    assert await database.from_primary(build)() is database.engine
@@ -0,0 +1,16 @@
+import pytest
+from static import is_versioned
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("files/comics/A/comic/vl1/ch1/3.3f9a2c81d0e4.jpg", True),
+    ("files/comics/A/poster/A_poster.3f9a2c81d0e4.jpg", True),
+    ("files/comics/A/comic/vl1/ch1/_v/3.3f9a2c81d0e4.480.webp", True),
+    ("files/comics/A/comic/vl1/ch1/3.jpg", False),
+    ("files/comics/A/comic/vl1/ch1/_v/3.480.webp", False),
+    # Хэш в названии комикса, а не перед расширением
+    ("files/comics/Cafe.deadbeefcafe_x/poster/Cafe.deadbeefcafe_x_poster.jpg", False),
+    ("files/comics/A/comic/vl1/ch1/3.3F9A2C81D0E4.jpg", False),
+])
+def test_is_versioned(path, expected):
+    assert is_versioned(path) is expected
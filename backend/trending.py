@@ -0,0 +1,177 @@
+import asyncio
+import contextlib
+import logging
+import sys
+from datetime import timedelta
+from typing import Optional
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from database import AsyncSessionLocal, engine
+from config import settings
+import models as m
+
+logger = logging.getLogger("comics.trending")
+
+# Сортировка trending: каждое событие (оценка, избранное, комментарий) даёт
+# вес w, который вдвое убывает за TRENDING_HALF_LIFE_HOURS. Вместо затухания
+# всех счётов со временем растут веса новых событий:
+#   trending_score = Σ w * 2 ** ((t - epoch) / half_life)
+# Порядок комиксов при этом тот же, а счёт можно только прибавлять.
+# Фоновая задача раз в TRENDING_INTERVAL_SECONDS добавляет события из окна
+# (processed_until, now() - TRENDING_LAG_SECONDS]. Когда веса вырастают
+# в 2 ** REBASE_HALF_LIVES раз, epoch переносится и счета делятся обратно.
+# Полный пересчёт: python trending.py rebuild
+#
+# Исправленная оценка и снятое избранное счёт не меняют: события учитываются
+# по времени создания строки. Избранное берётся из favorite_events, где на
+# пару (пользователь, комикс) одна строка с первым добавлением. Оценки и
+# комментарии без created_at (старше колонки) в счёт не попадают.
+
+STATE_ID = 1
+REBASE_HALF_LIVES = 32
+
+EVENTS_SQL = """
+SELECT comic_id,
+       sum(weight * power(
+           CAST(2 AS double precision),
+           CAST(extract(epoch FROM created_at - CAST(:epoch AS timestamptz)) AS double precision)
+           / CAST(:half_life AS double precision)
+       )) AS score
+FROM (
+    SELECT comic_id, created_at, CAST(:w_rating AS double precision) AS weight
+    FROM ratings WHERE created_at IS NOT NULL AND {window}
+    UNION ALL
+    SELECT comic_id, created_at, CAST(:w_favorite AS double precision)
+    FROM favorite_events WHERE {window}
+    UNION ALL
+    SELECT "comicID", created_at, CAST(:w_comment AS double precision)
+    FROM comments WHERE created_at IS NOT NULL AND {window}
+) events
+GROUP BY comic_id
+"""
+
+ADD_SCORES_SQL = """
+UPDATE comic_stats s SET trending_score = s.trending_score + e.score
+FROM ({events}) e
+WHERE s.comic_id = e.comic_id
+"""
+
+INCREMENT_SQL = text(ADD_SCORES_SQL.format(events=EVENTS_SQL.format(
+    window="created_at > CAST(:since AS timestamptz) AND created_at <= CAST(:until AS timestamptz)"
+)))
+FULL_SQL = text(ADD_SCORES_SQL.format(
+    events=EVENTS_SQL.format(window="created_at <= CAST(:until AS timestamptz)")
+))
+RESCALE_SQL = text("""
+UPDATE comic_stats
+SET trending_score = trending_score * power(CAST(2 AS double precision), -CAST(:shift AS double precision))
+WHERE trending_score <> 0
+""")
+
+_task: Optional[asyncio.Task] = None
+
+
+def _half_life_seconds() -> float:
+    return settings.TRENDING_HALF_LIFE_HOURS * 3600
+
+
+def _params(epoch, until, since=None) -> dict:
+    params = {
+        "epoch": epoch,
+        "until": until,
+        "half_life": _half_life_seconds(),
+        "w_rating": settings.TRENDING_WEIGHT_RATING,
+        "w_favorite": settings.TRENDING_WEIGHT_FAVORITE,
+        "w_comment": settings.TRENDING_WEIGHT_COMMENT,
+    }
+    if since is not None:
+        params["since"] = since
+    return params
+
+
+async def _until(db):
+    now = await db.scalar(select(func.now()))
+    return now - timedelta(seconds=settings.TRENDING_LAG_SECONDS)
+
+
+async def rebuild(db) -> int:
+    # Пересчёт с нуля, например после смены весов или периода полураспада
+    if db.get_bind().dialect.name != "postgresql":
+        return 0
+    until = await _until(db)
+    # Строка состояния блокируется первой: update() в других воркерах ждёт
+    stmt = pg_insert(m.TrendingState).values(id=STATE_ID, epoch=until, processed_until=until)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["id"],
+        set_={"epoch": stmt.excluded.epoch, "processed_until": stmt.excluded.processed_until},
+    ))
+    await db.execute(text("UPDATE comic_stats SET trending_score = 0 WHERE trending_score <> 0"))
+    result = await db.execute(FULL_SQL, _params(until, until))
+    return result.rowcount
+
+
+async def update(db) -> int:
+    # Добавляет события, появившиеся после прошлого запуска; возвращает
+    # число комиксов с изменившимся счётом
+    if db.get_bind().dialect.name != "postgresql":
+        return 0
+    state = await db.scalar(
+        select(m.TrendingState).where(m.TrendingState.id == STATE_ID).with_for_update()
+    )
+    if state is None:
+        return await rebuild(db)
+    until = await _until(db)
+    if until <= state.processed_until:
+        return 0
+    shift = (until - state.epoch).total_seconds() / _half_life_seconds()
+    if shift > REBASE_HALF_LIVES:
+        await db.execute(RESCALE_SQL, {"shift": shift})
+        state.epoch = until
+    result = await db.execute(INCREMENT_SQL, _params(state.epoch, until, state.processed_until))
+    state.processed_until = until
+    return result.rowcount
+
+
+async def _run():
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                await update(session)
+                await session.commit()
+        except Exception:
+            logger.exception("Не удалось обновить trending_score")
+        await asyncio.sleep(settings.TRENDING_INTERVAL_SECONDS)
+
+
+def start():
+    global _task
+    if _task is None and settings.TRENDING_INTERVAL_SECONDS > 0 and engine.dialect.name == "postgresql":
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await _task
+    _task = None
+
+
+async def main(command: str):
+    async with AsyncSessionLocal() as session:
+        if command == "rebuild":
+            changed = await rebuild(session)
+        else:
+            changed = await update(session)
+        await session.commit()
+    print(f"Счёт trending обновлён у {changed} комиксов")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("rebuild", "update"):
+        print("Использование: python trending.py rebuild|update")
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1]))
@@ -1,7 +1,27 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 import bcrypt
+from fastapi import HTTPException, status
+from config import settings
+
+# bcrypt отпускает GIL, поэтому хватает пула потоков. Очередь ограничена:
+# если ожидающих больше PASSWORD_HASH_QUEUE, запрос получает 429.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="bcrypt",
+)
+_pending = 0
+
+hash_metrics = {
+    "calls": 0,
+    "rejected": 0,
+    "seconds_total": 0.0,
+    "seconds_max": 0.0,
+}
 
 def hash_password(password: str) -> str:
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -9,4 +29,41 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(
         plain_password.encode('utf-8'),
         hashed_password.encode('utf-8')
-    )
\ No newline at end of file
+    )
+
+def needs_rehash(hashed_password: str) -> bool:
+    # $2b$12$... — второе поле хэша bcrypt содержит cost factor
+    try:
+        rounds = int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return True
+    return rounds != settings.BCRYPT_ROUNDS
+
+def hash_queue_depth() -> int:
+    return max(0, _pending - settings.PASSWORD_HASH_WORKERS)
+
+async def _run_hashing(func, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE:
+        hash_metrics["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов, попробуйте позже",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending -= 1
+        elapsed = time.perf_counter() - started
+        hash_metrics["calls"] += 1
+        hash_metrics["seconds_total"] += elapsed
+        hash_metrics["seconds_max"] = max(hash_metrics["seconds_max"], elapsed)
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hashing(verify_password, plain_password, hashed_password)